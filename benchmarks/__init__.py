@@ -0,0 +1,27 @@
+# mpvQC
+#
+# Copyright (C) 2020 mpvQC developers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Benchmarks regenerating the figures cited in the commit messages of performance changes.
+
+Run them from the root directory of the repository, e.g.:
+
+    python3 -m benchmarks.parsing
+
+Benchmarks of widgets and table models need PyGObject with Gtk 3 and glib-compile-resources.
+"""
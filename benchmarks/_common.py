@@ -0,0 +1,115 @@
+# mpvQC
+#
+# Copyright (C) 2020 mpvQC developers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import random
+import string
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from mpvqc.qc import Comment
+
+_ROOT = Path(__file__).resolve().parent.parent
+
+COMMENT_TYPES = ("Frame", "Timing", "Typeset", "Phrasing", "Spelling", "Note")
+
+
+def measure(func: Callable[[], object], repeat: int = 3) -> float:
+    """
+    Returns the time in seconds of the fastest of all runs of func.
+    """
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def random_time(rng: random.Random, hours: int = 2) -> str:
+    """
+    Returns a random comment time within the first hours of a video.
+    """
+
+    seconds = rng.randrange(hours * 3600)
+    return "{:02d}:{:02d}:{:02d}".format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+
+def random_note(rng: random.Random, words: int = 10) -> str:
+    """
+    Returns a note of random words, about 60 characters for the default amount of words.
+    """
+
+    return " ".join("".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 8))) for _ in range(words))
+
+
+def random_comments(count: int, seed: int = 0, sort: bool = True) -> List[Comment]:
+    """
+    Returns random comments, sorted by time unless sort is False.
+    """
+
+    rng = random.Random(seed)
+    comments = [Comment(random_time(rng), rng.choice(COMMENT_TYPES), random_note(rng)) for _ in range(count)]
+    if sort:
+        comments.sort(key=lambda c: c.comment_milliseconds)
+    return comments
+
+
+def write_documents(directory: Path, documents: int, comments: int, seed: int = 0) -> List[str]:
+    """
+    Writes qc documents of random comments, each sorted by time.
+
+    :return: the paths of the documents
+    """
+
+    paths = []
+
+    for index in range(documents):
+        lines = ["[FILE]", "date      : 2020-05-01 12:00:00", "generator : mpvQC", "path      : /videos/episode.mkv",
+                 "", "[DATA]"]
+        lines += ["[{}] [{}] {}".format(c.comment_time, c.comment_type, c.comment_note)
+                  for c in random_comments(comments, seed=seed + index)]
+        lines.append("# total lines: {}".format(comments))
+
+        document = directory / "document-{:03d}.txt".format(index)
+        document.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        paths.append(str(document))
+
+    return paths
+
+
+def setup_gtk(resources: bool = False) -> None:
+    """
+    Selects Gtk 3. If resources is True, the ui files are compiled into a resource bundle and registered,
+    as widgets with templates can not be imported otherwise.
+    """
+
+    import gi
+    gi.require_version("Gtk", "3.0")
+
+    if resources:
+        from gi.repository import Gio
+
+        data = _ROOT / "data"
+        target = Path(tempfile.mkdtemp()) / "mpvQC.gresource"
+        subprocess.run(["glib-compile-resources", "--sourcedir", str(data), "--target", str(target),
+                        str(data / "mpvQC.gresource.xml")], check=True)
+        Gio.Resource.load(str(target))._register()
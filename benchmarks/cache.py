@@ -0,0 +1,64 @@
+# mpvQC
+#
+# Copyright (C) 2020 mpvQC developers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Reading documents from the parse cache.
+
+Compares parsing documents with reading them from the cache (hit) and with parsing and caching them (miss).
+The cache directory is replaced by a temporary one.
+"""
+
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+from benchmarks._common import measure, write_documents
+from mpvqc.qc import _cache
+from mpvqc.qc._parser import parse_document
+
+DOCUMENTS = 20
+COMMENTS = 5000
+
+
+def main():
+    paths = write_documents(Path(tempfile.mkdtemp()), DOCUMENTS, COMMENTS)
+    cache_dir = Path(tempfile.mkdtemp())
+    _cache.get_app_paths = lambda: SimpleNamespace(dir_cache=cache_dir)
+
+    keys = [_cache.get_key(p) for p in paths]
+
+    def miss():
+        for key, path in zip(keys, paths):
+            document = parse_document(path)
+            _cache.put_document(key, document.video_path, document.comments)
+
+    def hit():
+        return [_cache.get_document(key) for key in keys]
+
+    miss()
+    for path, cached in zip(paths, hit()):
+        document = parse_document(path)
+        assert cached == (document.video_path, document.comments)
+
+    print("{} documents of {} comments".format(DOCUMENTS, COMMENTS))
+    print("  parse                {:8.3f} s".format(measure(lambda: [parse_document(p) for p in paths])))
+    print("  cache miss           {:8.3f} s".format(measure(miss)))
+    print("  cache hit            {:8.3f} s".format(measure(hit)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# mpvQC
+#
+# Copyright (C) 2020 mpvQC developers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Memory and sorting cost of comments.
+
+The reference is the plain class comments were before they became named tuples.
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+
+from benchmarks._common import COMMENT_TYPES, measure, random_note, random_time
+from mpvqc.qc import Comment
+
+COMMENTS = 1000000
+
+
+class _CommentReference:
+
+    def __init__(self, comment_time, comment_type, comment_note):
+        self.comment_time = comment_time
+        self.comment_type = comment_type
+        self.comment_note = comment_note
+
+
+def _build(comment_class, fields):
+    tracemalloc.start()
+    start = time.perf_counter()
+    comments = [comment_class(*f) for f in fields]
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0] - sys.getsizeof(comments)
+    tracemalloc.stop()
+    return comments, size / len(comments), elapsed
+
+
+def main():
+    rng = random.Random(0)
+    notes = [random_note(rng) for _ in range(1000)]
+
+    # Times and notes exist before, e.g. read by the parser. Only the comments themselves are measured
+    fields = [(random_time(rng), rng.choice(COMMENT_TYPES), rng.choice(notes)) for _ in range(COMMENTS)]
+    for f in fields:
+        Comment(*f)
+
+    print("{} comments, Python {}.{}".format(COMMENTS, *sys.version_info[:2]))
+
+    references, size, elapsed = _build(_CommentReference, fields)
+    print("  plain class          {:6.1f} bytes per comment, build {:.2f} s".format(size, elapsed))
+    del references
+
+    comments, size, elapsed = _build(Comment, fields)
+    print("  Comment              {:6.1f} bytes per comment, build {:.2f} s".format(size, elapsed))
+
+    by_string = measure(lambda: sorted(comments, key=lambda c: c.comment_time))
+    by_milliseconds = measure(lambda: sorted(comments, key=lambda c: c.comment_milliseconds))
+    print("  sort by time string  {:6.2f} s".format(by_string))
+    print("  sort by milliseconds {:6.2f} s".format(by_milliseconds))
+
+
+if __name__ == "__main__":
+    main()
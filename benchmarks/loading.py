@@ -0,0 +1,61 @@
+# mpvQC
+#
+# Copyright (C) 2020 mpvQC developers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Adding many comments to the table model, measured on the model only, without a view.
+"""
+
+from benchmarks._common import measure, random_comments, setup_gtk
+
+COMMENTS = 100000
+CHUNK_SIZE = 10000
+
+
+def main():
+    setup_gtk()
+    from mpvqc.ui.contentmaintablemodel import ContentMainTableModel
+
+    comments = random_comments(COMMENTS)
+
+    def add_comments():
+        ContentMainTableModel().add_comments(comments)
+
+    def load_comments():
+        ContentMainTableModel().load_comments(comments)
+
+    def load_comments_chunked():
+        model = ContentMainTableModel()
+        for start in range(0, COMMENTS, CHUNK_SIZE):
+            model.load_comments(comments[start:start + CHUNK_SIZE])
+
+    def merge():
+        model = ContentMainTableModel()
+        model.load_comments(comments[::2])
+        model.load_comments(comments[1::2])
+
+    print("{} comments sorted by time".format(COMMENTS))
+    print("  add_comments, per-row bisect and signal {:6.2f} s".format(measure(add_comments)))
+    print("  load_comments in one pass               {:6.2f} s".format(measure(load_comments)))
+    print("  load_comments in {}k chunks             {:6.2f} s".format(CHUNK_SIZE // 1000,
+                                                                     measure(load_comments_chunked)))
+    print("  merge {}k into {}k                      {:6.2f} s".format(COMMENTS // 2000, COMMENTS // 2000,
+                                                                     measure(merge)))
+
+
+if __name__ == "__main__":
+    main()
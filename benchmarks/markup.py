@@ -0,0 +1,59 @@
+# mpvQC
+#
+# Copyright (C) 2020 mpvQC developers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Drawing comments while scrolling through the table: the markup of each visible comment is built by the
+cell data function on every draw, with and without the markup cache.
+"""
+
+import random
+
+from benchmarks._common import measure, random_note, setup_gtk
+
+COMMENTS = 50000
+VISIBLE_ROWS = 40
+ROWS_PER_STEP = 3
+
+
+def main():
+    setup_gtk(resources=True)
+    from mpvqc.ui.contentmaintable import get_comment_markup
+
+    rng = random.Random(0)
+    notes = [random_note(rng, words=12) + (" see https://example.org/x" if i % 10 == 0 else "")
+             for i in range(COMMENTS)]
+    uncached = get_comment_markup.__wrapped__
+
+    def scroll(markup, query):
+        for top in range(0, COMMENTS - VISIBLE_ROWS, ROWS_PER_STEP):
+            for note in notes[top:top + VISIBLE_ROWS]:
+                markup(note, query)
+
+    calls = len(range(0, COMMENTS - VISIBLE_ROWS, ROWS_PER_STEP)) * VISIBLE_ROWS
+    print("{} comments, {} visible rows, {} rows per step, {} cell data calls".format(
+        COMMENTS, VISIBLE_ROWS, ROWS_PER_STEP, calls))
+
+    for name, query in (("without search", None), ("with search", "ab")):
+        get_comment_markup.cache_clear()
+        print("  {:15} {:.2f} s uncached -> {:.2f} s cached".format(
+            name + ":", measure(lambda: scroll(uncached, query), repeat=1),
+            measure(lambda: scroll(get_comment_markup, query), repeat=1)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# mpvQC
+#
+# Copyright (C) 2020 mpvQC developers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Merging the comments of many imported documents by time.
+"""
+
+import heapq
+import random
+
+from benchmarks._common import measure, random_comments
+from mpvqc.qc import _importer
+
+DOCUMENTS = 100
+COMMENTS = 5000
+
+
+def main():
+    streams = [tuple(random_comments(COMMENTS, seed=seed)) for seed in range(DOCUMENTS)]
+
+    # A few documents are not sorted by time
+    rng = random.Random(0)
+    for index in rng.sample(range(DOCUMENTS), DOCUMENTS // 20):
+        stream = list(streams[index])
+        rng.shuffle(stream)
+        streams[index] = tuple(stream)
+
+    merge_comments = getattr(_importer, "__merge_comments")
+
+    def merge_heapq():
+        sorted_streams = [s if all(a <= b for a, b in zip(s, s[1:])) else sorted(s) for s in streams]
+        return tuple(heapq.merge(*sorted_streams, key=lambda c: c.comment_milliseconds))
+
+    assert merge_comments(streams) == merge_heapq()
+
+    print("{} documents of {} comments".format(DOCUMENTS, COMMENTS))
+    print("  heapq.merge          {:6.3f} s".format(measure(merge_heapq)))
+    print("  run aware sort       {:6.3f} s".format(measure(lambda: merge_comments(streams))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# mpvQC
+#
+# Copyright (C) 2020 mpvQC developers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Parsing qc documents.
+
+The reference parser is the one used before parsing was done in a single pass: it reads all lines at once and
+extracts both columns by searching and replacing.
+Parsing in the main process is compared with parsing in a pool of one worker per processor as well. With a single
+processor no pool is started, so both take the same time.
+"""
+
+import re
+import tempfile
+from os import cpu_count
+from pathlib import Path
+
+from benchmarks._common import measure, write_documents
+from mpvqc.qc import Comment, _importer
+from mpvqc.qc._parser import parse_document, QC_DOCUMENT_HEADER
+
+DOCUMENTS = 20
+COMMENTS = 5000
+
+_REGEX_PATH = re.compile(r"^path\s*:*\s*")
+_REGEX_LINE = re.compile(r"^\[\d{2}:\d{2}:\d{2}\]\s*\[[^\[\]]*\]\s*.*$")
+_REGEX_COLUMN = re.compile(r"\[[^\[\]]*\]")
+
+
+def _parse_document_reference(document_path: str):
+    with open(document_path, "r", encoding="utf-8-sig") as file:
+        lines = [x.strip() for x in file.readlines() if x]
+
+    video_path, comments = None, []
+
+    if lines and lines[0].startswith(QC_DOCUMENT_HEADER):
+        for line in lines:
+            if video_path is None:
+                match = _REGEX_PATH.match(line)
+                if match is not None:
+                    video_path = line.replace(match.group(), "").strip() or None
+
+            if _REGEX_LINE.match(line) is not None:
+                time_braces = _REGEX_COLUMN.search(line).group(0)
+                line = line.replace(time_braces, "", 1)
+                type_braces = _REGEX_COLUMN.search(line).group(0)
+                line = line.replace(type_braces, "", 1)
+                comments.append(Comment(time_braces[1:-1], type_braces[1:-1], line.strip().replace("\xad", "")))
+
+    return video_path, tuple(comments)
+
+
+def main():
+    paths = write_documents(Path(tempfile.mkdtemp()), DOCUMENTS, COMMENTS)
+    lines = sum(sum(1 for _ in open(p, encoding="utf-8")) for p in paths)
+
+    for path in paths:
+        document = parse_document(path)
+        assert (document.video_path, document.comments) == _parse_document_reference(path)
+
+    print("{} documents of {} comments, {} lines".format(DOCUMENTS, COMMENTS, lines))
+
+    reference = measure(lambda: [_parse_document_reference(p) for p in paths])
+    single_pass = measure(lambda: [parse_document(p) for p in paths])
+    print("  reference parser     {:8.0f} lines/s".format(lines / reference))
+    print("  single pass parser   {:8.0f} lines/s".format(lines / single_pass))
+
+    parse_documents = getattr(_importer, "__parse_documents")
+    main_process = measure(lambda: parse_documents(paths, 1))
+    pool = measure(lambda: parse_documents(paths, 0))
+    print("  main process         {:8.3f} s".format(main_process))
+    print("  pool ({} processors) {:8.3f} s".format(cpu_count() or 1, pool))
+
+
+if __name__ == "__main__":
+    main()
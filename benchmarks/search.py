@@ -0,0 +1,85 @@
+# mpvQC
+#
+# Copyright (C) 2020 mpvQC developers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+The trigram index of the search: building it a time budgeted slice at a time, its memory and
+queries answered by it compared to scanning all notes.
+"""
+
+import time
+import tracemalloc
+
+from benchmarks._common import random_comments, setup_gtk
+
+COMMENTS = 100000
+
+# As used by the search frame
+TIME_BUDGET = 0.01
+
+QUERIES = ("abc", "gyssn", "zzzz", "the quick")
+
+
+def main():
+    setup_gtk()
+    from mpvqc.qc._searchindex import SearchIndex
+    from mpvqc.ui.contentmaintablemodel import ContentMainTableModel
+    from mpvqc.utils import get_search_func, QueryMode
+
+    model = ContentMainTableModel()
+    model.load_comments(random_comments(COMMENTS))
+
+    index = SearchIndex()
+    slices = []
+    start = time.perf_counter()
+    while True:
+        slice_start = time.perf_counter()
+        done = index.update(model, TIME_BUDGET)
+        slices.append(time.perf_counter() - slice_start)
+        if done:
+            break
+    elapsed = time.perf_counter() - start
+
+    print("{} comments".format(COMMENTS))
+    print("  build {:.2f} s in {} slices, longest {:.1f} ms".format(elapsed, len(slices), max(slices) * 1000))
+
+    tracemalloc.start()
+    measured = SearchIndex()
+    measured.update(model, float("inf"))
+    print("  index memory {:.1f} MB".format(tracemalloc.get_traced_memory()[0] / 1e6))
+    tracemalloc.stop()
+    del measured
+
+    notes = model.get_notes()
+
+    for query in QUERIES:
+        search = get_search_func(query, QueryMode.TEXT)
+
+        start = time.perf_counter()
+        scanned = [i for i, note in enumerate(notes) if search(note)]
+        scan = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = model.get_indices(index.find(query, search))
+        indexed = time.perf_counter() - start
+
+        assert found == scanned
+        print("  {:12} {:5d} matches   scan {:.3f} s   index {:.4f} s".format(repr(query), len(found), scan, indexed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# mpvQC
+#
+# Copyright (C) 2020 mpvQC developers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+"""
+Writing qc documents: rendering the content and writing it to a new file, synced to disk.
+
+The reference renders the whole document as one string and writes it without a temporary file and without syncing,
+as documents were written before.
+"""
+
+import tempfile
+from pathlib import Path
+
+from benchmarks._common import measure, random_comments
+from mpvqc.qc import _exporter
+
+SIZES = (10000, 100000, 1000000)
+
+
+def _iter_file_content(comments):
+    iter_file_content = getattr(_exporter, "__iter_file_content")
+    return iter_file_content(True, True, "2020-05-01 12:00:00", True, "mpvQC", True, "nick", True,
+                             "/videos/episode.mkv", comments)
+
+
+def _write_reference(file_path: str, comments) -> None:
+    header = "[FILE]\ndate      : 2020-05-01 12:00:00\ngenerator : mpvQC\nnickname  : nick\n" \
+             "path      : /videos/episode.mkv\n"
+    content = "{}\n[DATA]\n{}\n# total lines: {}".format(header, "\n".join(map(str, comments)), len(comments))
+
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def main():
+    directory = Path(tempfile.mkdtemp())
+    target = str(directory / "document.txt")
+
+    print("write latency, reference vs streamed into a temporary file incl. fsync of file and directory")
+
+    for size in SIZES:
+        comments = tuple(random_comments(size))
+
+        _write_reference(target, comments)
+        expected = Path(target).read_bytes()
+        _exporter.write_qc_document(target, _iter_file_content(comments))
+        assert Path(target).read_bytes() == expected
+
+        reference = measure(lambda: _write_reference(target, comments))
+        streamed = measure(lambda: _exporter.write_qc_document(target, _iter_file_content(comments)))
+        print("  {:8d} comments   {:.3f} s   {:.3f} s".format(size, reference, streamed))
+
+
+if __name__ == "__main__":
+    main()
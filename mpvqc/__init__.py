@@ -16,10 +16,14 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
-from mpvqc.app import Application
-from mpvqc.settings import Settings
-from mpvqc.utils.files import FilePaths
-from mpvqc.utils.metadata import Metadata
+from typing import TYPE_CHECKING
+
+# Worker processes import parts of the package, so importing the package itself must not import Gtk
+if TYPE_CHECKING:
+    from mpvqc.app import Application
+    from mpvqc.settings import Settings
+    from mpvqc.utils.files import FilePaths
+    from mpvqc.utils.metadata import Metadata
 
 
 class AppHolder:
@@ -29,17 +33,17 @@ class AppHolder:
     SETTINGS = None
 
 
-def get_app() -> Application:
+def get_app() -> "Application":
     return AppHolder.APP
 
 
-def get_app_metadata() -> Metadata:
+def get_app_metadata() -> "Metadata":
     return AppHolder.METADATA
 
 
-def get_app_paths() -> FilePaths:
+def get_app_paths() -> "FilePaths":
     return AppHolder.PATHS
 
 
-def get_settings() -> Settings:
+def get_settings() -> "Settings":
     return AppHolder.SETTINGS
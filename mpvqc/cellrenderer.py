@@ -19,7 +19,7 @@ import platform
 from gi.repository import Gtk, Pango, Gdk
 
 from mpvqc import get_settings
-from mpvqc.utils import get_longest_string_from, validate_text_insertion
+from mpvqc.utils import validate_text_insertion
 
 _PADDING = (6, 6)
 
@@ -60,7 +60,7 @@ class CellRendererType(Gtk.CellRendererText):
         """
 
         layout = Gtk.Label().get_layout()
-        layout.set_markup(max(get_longest_string_from(self.__model, 2), get_settings().comment_types_longest, key=len))
+        layout.set_markup(max(self.__model.get_longest_type(), get_settings().comment_types_longest, key=len))
         pixel_size = layout.get_pixel_size()
         size = pixel_size.width + (self.get_padding()[0] * 4)
         self.__preferred_width = size, size
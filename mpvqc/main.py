@@ -41,7 +41,7 @@ def main(app_id, app_name, app_url, app_version, vcs_hash, vcs_tag):
     AppHolder.PATHS = FilePaths()
 
     # Settings
-    from mpvqc import Settings
+    from mpvqc.settings import Settings
     AppHolder.SETTINGS = Settings(app_id=app_id,
                                   app_resource_base_path=path_resource_base)
 
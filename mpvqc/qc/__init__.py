@@ -16,22 +16,93 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
-class Comment:
+from typing import NamedTuple
+
+# Milliseconds of all time strings seen so far, there are only as many distinct ones as times in the longest video
+_MILLISECONDS = {}
+
+_new_tuple = tuple.__new__
+
+
+def to_milliseconds(comment_time: str) -> int:
+    r"""
+    Converts a comment time into milliseconds.
+
+    :param comment_time: a string matching pattern "\d{2}:\d{2}:\d{2}", optionally followed by "\.\d{1,3}"
+    :return: the amount of milliseconds
+    """
+
+    milliseconds = _MILLISECONDS.get(comment_time)
+    if milliseconds is None:
+        hours, minutes, seconds = comment_time.split(":")
+        seconds, __, fraction = seconds.partition(".")
+        milliseconds = (int(hours) * 3600 + int(minutes) * 60 + int(seconds)) * 1000 + int(fraction.ljust(3, "0"))
+        _MILLISECONDS[comment_time] = milliseconds
+    return milliseconds
+
+
+def replace_special_characters(string_to_replace):
+    """
+    Removes forbidden characters in a string.
+
+    :param string_to_replace: the original string
+    :return: the modified string
+    """
+
+    return string_to_replace \
+        .replace(u'\xad', '')  # https://www.charbase.com/00ad-unicode-soft-hyphen
+
+
+class _CommentFields(NamedTuple):
+    comment_time: str
+    comment_type: str
+    comment_note: str
+
+    # The time in milliseconds, derived from the comment time. Comments are sorted by it
+    comment_milliseconds: int
+
+
+class Comment(_CommentFields):
     """
     A representation of a comment line.
+
+    Comments are immutable and hashable. They are ordered by their time only,
+    while two comments are equal only if time, type and note are equal.
     """
 
-    def __init__(self, comment_time, comment_type, comment_note):
-        self.comment_time = comment_time
-        self.comment_type = comment_type
-        self.comment_note = comment_note
+    __slots__ = ()
+
+    def __new__(cls, comment_time: str, comment_type: str, comment_note: str):
+        milliseconds = _MILLISECONDS.get(comment_time)
+        if milliseconds is None:
+            milliseconds = to_milliseconds(comment_time)
+        return _new_tuple(cls, (comment_time, comment_type, comment_note, milliseconds))
+
+    def __getnewargs__(self):
+        return self[:3]
 
     def __str__(self):
         return "[{}] [{}] {}".format(self.comment_time, self.comment_type, self.comment_note)
 
-    def __eq__(self, other):
+    def __repr__(self):
+        return "Comment({!r}, {!r}, {!r})".format(self.comment_time, self.comment_type, self.comment_note)
+
+    def __lt__(self, other):
+        if isinstance(other, Comment):
+            return self.comment_milliseconds < other.comment_milliseconds
+        return NotImplemented
+
+    def __le__(self, other):
+        if isinstance(other, Comment):
+            return self.comment_milliseconds <= other.comment_milliseconds
+        return NotImplemented
+
+    def __gt__(self, other):
+        if isinstance(other, Comment):
+            return self.comment_milliseconds > other.comment_milliseconds
+        return NotImplemented
+
+    def __ge__(self, other):
         if isinstance(other, Comment):
-            return self.comment_time == other.comment_time \
-                   and self.comment_type == other.comment_type \
-                   and self.comment_note == other.comment_note
-        return False
+            return self.comment_milliseconds >= other.comment_milliseconds
+        return NotImplemented
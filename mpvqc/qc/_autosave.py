@@ -0,0 +1,142 @@
+# mpvQC
+#
+# Copyright (C) 2020 mpvQC developers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from hashlib import blake2b
+from threading import Lock, Thread
+from typing import Optional, NamedTuple, Iterator, Callable, Tuple
+
+from gi.repository import GLib
+
+from mpvqc.qc import Comment, _exporter
+
+# Amount of comments fed into the fingerprint at once
+_FINGERPRINT_CHUNK_SIZE = 4096
+
+
+class AutoSaveSnapshot(NamedTuple):
+    """Everything needed to write an auto save without touching the current state"""
+
+    # The path of the video the comments belong to
+    video_path: str
+
+    # The comments of the document
+    comments: Tuple[Comment]
+
+    # The content of the document, rendered while writing
+    file_content: Iterator[str]
+
+
+class AutoSaver:
+    """
+    Writes auto saves on a background thread.
+    While an auto save is being written, only the latest of all newly requested snapshots is kept and written next.
+    Snapshots with the same video and comments as the last written one are skipped.
+    """
+
+    def __init__(self, on_finished: Callable[[bool], None]):
+        """
+        :param on_finished: called on the main loop after writing a snapshot, True if writing succeeded, False else
+        """
+
+        self.__on_finished = on_finished
+        self.__lock = Lock()
+        self.__pending: Optional[AutoSaveSnapshot] = None
+        self.__running = False
+
+        # Only accessed by the worker thread
+        self.__last_video_path: Optional[str] = None
+        self.__last_comments: Optional[Tuple[Comment]] = None
+        self.__last_fingerprint: Optional[bytes] = None
+
+        self.__written_count = 0
+        self.__skipped_count = 0
+
+    @property
+    def written_count(self) -> int:
+        """Returns the amount of snapshots written so far"""
+
+        return self.__written_count
+
+    @property
+    def skipped_count(self) -> int:
+        """Returns the amount of snapshots skipped so far because nothing changed"""
+
+        return self.__skipped_count
+
+    def save(self, snapshot: AutoSaveSnapshot) -> None:
+        """
+        Requests to write the snapshot. Replaces a snapshot which is still waiting to be written.
+
+        :param snapshot: the snapshot to write
+        """
+
+        with self.__lock:
+            self.__pending = snapshot
+            if self.__running:
+                return
+            self.__running = True
+
+        Thread(target=self.__run, name="mpvqc-auto-save").start()
+
+    def __run(self) -> None:
+        while True:
+            with self.__lock:
+                snapshot, self.__pending = self.__pending, None
+                if snapshot is None:
+                    self.__running = False
+                    return
+
+            # The fingerprint covers the video path as well, so it is only reused for the same video
+            if snapshot.comments is self.__last_comments and snapshot.video_path == self.__last_video_path:
+                fingerprint = self.__last_fingerprint
+            else:
+                fingerprint = self.__fingerprint(snapshot)
+
+            if fingerprint == self.__last_fingerprint:
+                self.__skipped_count += 1
+                continue
+
+            # noinspection PyBroadException
+            try:
+                _exporter.write_auto_save(video_path=snapshot.video_path, file_content=snapshot.file_content)
+                success = True
+            except Exception:
+                success = False
+
+            if success:
+                self.__last_video_path = snapshot.video_path
+                self.__last_comments = snapshot.comments
+                self.__last_fingerprint = fingerprint
+                self.__written_count += 1
+
+            GLib.idle_add(self.__on_finished, success)
+
+    @staticmethod
+    def __fingerprint(snapshot: AutoSaveSnapshot) -> bytes:
+        """
+        Returns a fingerprint of the video path and all comments. The document header is not part of it.
+        """
+
+        fingerprint = blake2b(snapshot.video_path.encode("utf-8"), digest_size=16)
+        comments = snapshot.comments
+
+        for start in range(0, len(comments), _FINGERPRINT_CHUNK_SIZE):
+            fingerprint.update(b"\n")
+            fingerprint.update("\n".join(map(str, comments[start:start + _FINGERPRINT_CHUNK_SIZE])).encode("utf-8"))
+
+        return fingerprint.digest()
@@ -0,0 +1,335 @@
+# mpvQC
+#
+# Copyright (C) 2020 mpvQC developers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import re
+import sqlite3
+import struct
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, NamedTuple, List, Iterable
+from zipfile import ZipFile, BadZipFile, ZIP_DEFLATED, ZIP_STORED
+
+from mpvqc import get_app_paths
+from mpvqc.qc._backupstore import BackupStore, Snapshot
+
+# Bump whenever the schema or the meaning of a column changes, the index is rebuilt from scratch then
+_INDEX_VERSION = 2
+
+_INDEX_NAME = ".index.sqlite"
+
+# Auto saves in zip archives are named like '2020-05-01_12-30-45.123456-video.txt'
+_REGEX_ZIP_ENTRY = re.compile(r"^(?P<time>\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}(\.\d{1,6})?)-(?P<video>.*)\.txt$")
+
+# Local file header of a zip entry: signature, versions, flags, method, time, date, crc, sizes, name and extra length
+_ZIP_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+_ZIP_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+
+# Snapshots of the backup store have no offset, their content is made of chunks
+_NO_OFFSET = -1
+
+# Comments of a qc document are the lines starting with '[' after this line, as counted by the backup store
+_DATA_HEADER = b"[DATA]"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    source TEXT NOT NULL,
+    name TEXT NOT NULL,
+    video_name TEXT NOT NULL,
+    time TEXT NOT NULL,
+    comments INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    compressed_size INTEGER NOT NULL,
+    PRIMARY KEY (source, name)
+);
+CREATE INDEX IF NOT EXISTS entries_time ON entries (time);
+CREATE INDEX IF NOT EXISTS entries_video_time ON entries (video_name COLLATE NOCASE, time);
+"""
+
+
+class BackupEntry(NamedTuple):
+    """A single auto save, either from a zip archive or from the backup store"""
+
+    # The zip archive or the snapshot manifest the auto save is stored in
+    source: str
+
+    # The name of the entry in the zip archive or the id of the snapshot
+    name: str
+
+    # The name of the video without directory and extension
+    video_name: str
+
+    # When the auto save was written
+    time: datetime
+
+    # The number of comments of the document
+    comments: int
+
+    # The offset of the local file header of the entry in the zip archive, -1 for snapshots
+    offset: int
+
+    # The size of the compressed entry in the zip archive, 0 for snapshots
+    compressed_size: int
+
+
+class BackupIndex:
+    """
+    A persistent index of all auto saves, stored next to them in the backup directory.
+
+    Updating the index only looks at zip archives that changed since the last update and at snapshots
+    which are new. Zip archives only grow over the month, so only their new entries are read. The comments of
+    each entry are counted once while indexing it.
+    """
+
+    def __init__(self, backup_directory: Optional[Path] = None):
+        """
+        :param backup_directory: the directory holding the auto saves
+        :raise OSError: if the index can not be created
+        :raise sqlite3.Error: if the index can not be opened
+        """
+
+        self.__directory = backup_directory or get_app_paths().dir_backup
+        self.__store = BackupStore(self.__directory)
+
+        index_path = self.__directory / _INDEX_NAME
+
+        try:
+            self.__connection = _connect(index_path)
+        except sqlite3.DatabaseError:
+            # A damaged index is rebuilt from the auto saves by the next update
+            index_path.unlink()
+            self.__connection = _connect(index_path)
+
+    def close(self) -> None:
+        self.__connection.close()
+
+    def update(self) -> int:
+        """
+        Adds all auto saves written since the last update and removes all auto saves which are gone.
+
+        :return: the number of added entries
+        """
+
+        added = 0
+        indexed = {source: (size, mtime_ns) for source, size, mtime_ns in self.__connection.execute(
+            "SELECT path, size, mtime_ns FROM sources")}
+        present = set()
+
+        sources = [(path, None) for path in sorted(self.__directory.glob("*.zip"))]
+        sources += [(self.__store.get_snapshot_path(snapshot.snapshot_id), snapshot)
+                    for snapshot in self.__store.get_snapshots()]
+
+        for path, snapshot in sources:
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+
+            source = str(path)
+            present.add(source)
+
+            if indexed.get(source) == (stat.st_size, stat.st_mtime_ns):
+                continue
+
+            with self.__connection as connection:
+                if snapshot is None:
+                    added += self.__index_zip(connection, source)
+                else:
+                    added += self.__index_snapshot(connection, source, snapshot)
+
+                connection.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?)",
+                                   (source, stat.st_size, stat.st_mtime_ns))
+
+        gone = [(source,) for source in indexed if source not in present]
+        if gone:
+            with self.__connection as connection:
+                connection.executemany("DELETE FROM entries WHERE source = ?", gone)
+                connection.executemany("DELETE FROM sources WHERE path = ?", gone)
+
+        return added
+
+    def find(
+            self,
+            video_name: Optional[str] = None,
+            since: Optional[datetime] = None,
+            until: Optional[datetime] = None,
+            limit: int = 1000
+    ) -> List[BackupEntry]:
+        """
+        Returns the latest auto saves matching all given criteria, the latest first.
+
+        :param video_name: a part of the video name, case insensitive
+        :param since: the earliest time of an auto save
+        :param until: the latest time of an auto save
+        :param limit: the maximum number of auto saves to return
+        """
+
+        conditions, parameters = [], []
+
+        if video_name:
+            escaped = video_name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            conditions.append("video_name LIKE ? ESCAPE '\\'")
+            parameters.append("%{}%".format(escaped))
+        if since is not None:
+            conditions.append("time >= ?")
+            parameters.append(since.isoformat())
+        if until is not None:
+            conditions.append("time <= ?")
+            parameters.append(until.isoformat())
+
+        query = "SELECT * FROM entries"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY time DESC LIMIT ?"
+        parameters.append(limit)
+
+        return [
+            BackupEntry(source, name, video, datetime.fromisoformat(time), comments, offset, compressed_size)
+            for source, name, video, time, comments, offset, compressed_size
+            in self.__connection.execute(query, parameters)
+        ]
+
+    def read_entry(self, entry: BackupEntry) -> str:
+        """
+        Returns the document of an auto save.
+
+        :param entry: the auto save to read
+        :raise OSError: if the auto save can not be read
+        :raise ValueError: if the auto save is damaged
+        """
+
+        if entry.offset == _NO_OFFSET:
+            return self.__store.get_snapshot_content(entry.name)
+        return _read_zip_entry(entry).decode("utf-8")
+
+    def __index_zip(self, connection: sqlite3.Connection, source: str) -> int:
+        known = {name for name, in connection.execute("SELECT name FROM entries WHERE source = ?", (source,))}
+        rows = []
+
+        try:
+            with ZipFile(source) as zip_file:
+                for info in zip_file.infolist():
+                    if info.filename in known:
+                        continue
+
+                    try:
+                        with zip_file.open(info) as entry:
+                            comments = _count_comments(entry)
+                    except (BadZipFile, zlib.error, NotImplementedError):
+                        # Damaged entries can not be restored either
+                        continue
+
+                    match = _REGEX_ZIP_ENTRY.match(info.filename)
+                    if match:
+                        time = _parse_time(match.group("time"))
+                        video_name = match.group("video")
+                    else:
+                        time = datetime(*info.date_time)
+                        video_name = Path(info.filename).stem
+
+                    rows.append((source, info.filename, video_name, time.isoformat(), comments,
+                                 info.header_offset, info.compress_size))
+        except (OSError, BadZipFile):
+            # Keep what was read so far, damaged archives are retried as soon as they change
+            pass
+
+        connection.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def __index_snapshot(self, connection: sqlite3.Connection, source: str, snapshot: Snapshot) -> int:
+        try:
+            info = self.__store.get_snapshot_info(snapshot.snapshot_id)
+        except (OSError, ValueError, KeyError):
+            return 0
+
+        connection.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                           (source, snapshot.snapshot_id, snapshot.video_name, snapshot.time.isoformat(),
+                            info.comments, _NO_OFFSET, 0))
+        return 1
+
+
+def _connect(index_path: Path) -> sqlite3.Connection:
+    connection = sqlite3.connect(str(index_path))
+
+    try:
+        with connection:
+            if connection.execute("PRAGMA user_version").fetchone()[0] != _INDEX_VERSION:
+                connection.executescript("DROP TABLE IF EXISTS sources; DROP TABLE IF EXISTS entries;")
+                connection.execute("PRAGMA user_version = {}".format(_INDEX_VERSION))
+            connection.executescript(_SCHEMA)
+    except sqlite3.Error:
+        connection.close()
+        raise
+
+    return connection
+
+
+def _count_comments(lines: Iterable[bytes]) -> int:
+    """
+    Counts the comments of a qc document line by line, without holding the document in memory.
+    """
+
+    lines = iter(lines)
+
+    for line in lines:
+        if line.rstrip(b"\r\n") == _DATA_HEADER:
+            break
+
+    return sum(1 for line in lines if line.startswith(b"["))
+
+
+def _parse_time(value: str) -> datetime:
+    if "." in value:
+        return datetime.strptime(value, "%Y-%m-%d_%H-%M-%S.%f")
+    return datetime.strptime(value, "%Y-%m-%d_%H-%M-%S")
+
+
+def _read_zip_entry(entry: BackupEntry) -> bytes:
+    """
+    Reads a zip entry directly at its offset without reading the central directory of the archive.
+    """
+
+    with open(entry.source, "rb") as file:
+        file.seek(entry.offset)
+        header = file.read(_ZIP_LOCAL_HEADER.size)
+
+        if len(header) != _ZIP_LOCAL_HEADER.size:
+            raise ValueError("Zip entry damaged", entry.name)
+
+        signature, _, _, method, _, _, _, _, _, name_length, extra_length = _ZIP_LOCAL_HEADER.unpack(header)
+        if signature != _ZIP_LOCAL_HEADER_SIGNATURE:
+            raise ValueError("Zip entry damaged", entry.name)
+
+        file.seek(name_length + extra_length, 1)
+        data = file.read(entry.compressed_size)
+
+    if method == ZIP_STORED:
+        return data
+    if method == ZIP_DEFLATED:
+        try:
+            return zlib.decompress(data, -zlib.MAX_WBITS)
+        except zlib.error as e:
+            raise ValueError("Zip entry damaged", entry.name) from e
+
+    with ZipFile(entry.source) as zip_file:
+        return zip_file.read(entry.name)
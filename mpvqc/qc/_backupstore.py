@@ -0,0 +1,373 @@
+# mpvQC
+#
+# Copyright (C) 2020 mpvQC developers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import json
+import os
+import zlib
+from contextlib import suppress
+from datetime import datetime, timedelta
+from hashlib import blake2b
+from os import path
+from pathlib import Path
+from secrets import token_hex
+from typing import Optional, NamedTuple, Iterable, Iterator, List, Set
+
+from mpvqc import get_app_paths
+
+# Bump whenever the layout of manifests or chunks changes
+_STORE_VERSION = 1
+
+_DIR_STORE = "store"
+_DIR_CHUNKS = "chunks"
+_DIR_SNAPSHOTS = "snapshots"
+
+_SNAPSHOT_SUFFIX = ".json"
+
+# Timestamps are the first part of snapshot names, thereby snapshots sort by time
+_SNAPSHOT_TIME_FORMAT = "%Y-%m-%d_%H-%M-%S.%f"
+_SNAPSHOT_TIME_LENGTH = len("0000-00-00_00-00-00.000000")
+
+# A chunk ends after a line whose checksum has all of these bits unset, yielding chunks of 128 lines on average.
+# As boundaries depend on the content only, inserting or removing comments changes only the chunks around them.
+_CHUNK_BOUNDARY_MASK = 128 - 1
+_CHUNK_MAX_LINES = 1024
+
+# The document header changes with each backup (date), so it always ends a chunk of its own
+_CHUNK_HEADER_END = b"[DATA]\n"
+
+# Retention runs only if limits are exceeded by this much, so unreferenced chunks are collected in batches
+_RETENTION_SLACK_COUNT = 0.1
+_RETENTION_SLACK_AGE = timedelta(days=1)
+
+
+class Snapshot(NamedTuple):
+    """A backup in the store"""
+
+    # Identifies the snapshot in the store
+    snapshot_id: str
+
+    # When the backup was written
+    time: datetime
+
+    # The name of the video without directory and extension
+    video_name: str
+
+
+class SnapshotInfo(NamedTuple):
+    """Details of a backup in the store"""
+
+    # The path of the video the document belongs to
+    video_path: str
+
+    # The size of the document in bytes
+    size: int
+
+    # The number of comments in the document
+    comments: int
+
+
+class BackupStore:
+    """
+    Stores backups of qc documents deduplicated.
+
+    Documents are split into chunks of lines. Each unique chunk is stored once, compressed and named by its hash.
+    A snapshot is a small manifest listing the chunks its document consists of.
+    Chunks are written before their manifest, so a snapshot is complete as soon as its manifest exists.
+    """
+
+    def __init__(self, backup_directory: Optional[Path] = None):
+        """
+        :param backup_directory: the directory to create the store in
+        """
+
+        directory = (backup_directory or get_app_paths().dir_backup) / _DIR_STORE
+        self.__dir_chunks = directory / _DIR_CHUNKS
+        self.__dir_snapshots = directory / _DIR_SNAPSHOTS
+        self.__dir_chunks.mkdir(exist_ok=True, parents=True)
+        self.__dir_snapshots.mkdir(exist_ok=True, parents=True)
+
+    def add_snapshot(self, video_path: str, file_content: Iterable[str], time: Optional[datetime] = None) -> Snapshot:
+        """
+        Stores a qc document as new snapshot.
+
+        :param video_path: the path of the video the document belongs to
+        :param file_content: the content of the document, e.g. from iter_file_content
+        :param time: the time of the backup, now if omitted
+        :return: the new snapshot
+        """
+
+        time = time or datetime.now()
+        video_name = path.splitext(path.basename(video_path))[0]
+        snapshot_id = "{}-{}".format(time.strftime(_SNAPSHOT_TIME_FORMAT), video_name)
+
+        chunk_ids = []
+        size = 0
+        comments = 0
+        in_data = False
+
+        # Each chunk is stored as soon as it ends, the document is never held in memory as a whole
+        for chunk in _split_into_chunks(_iter_lines(file_content)):
+            if in_data:
+                comments += sum(1 for line in chunk if line.startswith(b"["))
+            elif chunk[-1] == _CHUNK_HEADER_END:
+                in_data = True
+
+            chunk = b"".join(chunk)
+            size += len(chunk)
+            chunk_ids.append(self.__put_chunk(chunk))
+
+        manifest = {
+            "version": _STORE_VERSION,
+            "video": video_path,
+            "size": size,
+            "comments": comments,
+            "chunks": chunk_ids,
+        }
+
+        _write_atomically(self.get_snapshot_path(snapshot_id), json.dumps(manifest).encode("utf-8"))
+        return Snapshot(snapshot_id, time, video_name)
+
+    def get_snapshots(self) -> List[Snapshot]:
+        """
+        Returns all snapshots of the store, the oldest first.
+        """
+
+        snapshots = []
+
+        for file_name in sorted(os.listdir(self.__dir_snapshots)):
+            snapshot = _parse_snapshot_name(file_name)
+            if snapshot is not None:
+                snapshots.append(snapshot)
+
+        return snapshots
+
+    def get_snapshot_path(self, snapshot_id: str) -> Path:
+        """
+        Returns the path of the manifest of a snapshot.
+        """
+
+        return self.__dir_snapshots / (snapshot_id + _SNAPSHOT_SUFFIX)
+
+    def get_snapshot_info(self, snapshot_id: str) -> SnapshotInfo:
+        """
+        Returns details of a snapshot without rebuilding its document.
+
+        :param snapshot_id: the snapshot to describe
+        :raise OSError: if the snapshot can not be read
+        :raise ValueError: if the snapshot is damaged
+        """
+
+        manifest = self.__read_manifest(snapshot_id)
+        return SnapshotInfo(manifest["video"], manifest["size"], manifest["comments"])
+
+    def iter_snapshot_content(self, snapshot_id: str) -> Iterator[str]:
+        """
+        Rebuilds the document of a snapshot piece by piece.
+
+        :param snapshot_id: the snapshot to rebuild
+        :return: an iterator over the file content of the qc document
+        :raise OSError: if the snapshot or one of its chunks can not be read
+        :raise ValueError: if the snapshot or one of its chunks is damaged
+        """
+
+        manifest = self.__read_manifest(snapshot_id)
+
+        for chunk_id in manifest["chunks"]:
+            yield self.__get_chunk(chunk_id).decode("utf-8")
+
+    def get_snapshot_content(self, snapshot_id: str) -> str:
+        """
+        Rebuilds the document of a snapshot.
+
+        :param snapshot_id: the snapshot to rebuild
+        :return: the file content of the qc document
+        :raise OSError: if the snapshot or one of its chunks can not be read
+        :raise ValueError: if the snapshot or one of its chunks is damaged
+        """
+
+        return "".join(self.iter_snapshot_content(snapshot_id))
+
+    def restore_snapshot(self, snapshot_id: str, file_path: str) -> None:
+        """
+        Rebuilds the document of a snapshot and writes it to the given file.
+
+        :param snapshot_id: the snapshot to rebuild
+        :param file_path: the file to write the document to
+        :raise OSError: if the snapshot can not be read or the document can not be written
+        :raise ValueError: if the snapshot or one of its chunks is damaged
+        """
+
+        from mpvqc.qc._exporter import write_qc_document
+
+        # Rebuild completely first, so a damaged snapshot never replaces an existing document
+        content = self.get_snapshot_content(snapshot_id)
+        write_qc_document(file_path, (content,))
+
+    def apply_retention(self, max_age_days: int, max_count: int, now: Optional[datetime] = None) -> int:
+        """
+        Removes snapshots older than max_age_days and the oldest snapshots beyond max_count,
+        then removes all chunks no snapshot refers to anymore.
+        Nothing happens unless a limit is exceeded noticeably, so retention is cheap to call after each backup.
+
+        :param max_age_days: the number of days to keep snapshots, 0 to keep them regardless of their age
+        :param max_count: the maximum number of snapshots to keep, 0 to keep any number of snapshots
+        :param now: the time to compute the age of snapshots with, now if omitted
+        :return: the number of removed snapshots
+        """
+
+        snapshots = self.get_snapshots()
+        now = now or datetime.now()
+
+        exceeds_count = max_count > 0 and len(snapshots) > max_count * (1 + _RETENTION_SLACK_COUNT)
+        exceeds_age = max_age_days > 0 and bool(snapshots) \
+                      and snapshots[0].time < now - timedelta(days=max_age_days) - _RETENTION_SLACK_AGE
+
+        if not exceeds_count and not exceeds_age:
+            return 0
+
+        keep = snapshots[-max_count:] if max_count > 0 else snapshots
+        if max_age_days > 0:
+            oldest = now - timedelta(days=max_age_days)
+            keep = [snapshot for snapshot in keep if snapshot.time >= oldest]
+
+        keep_ids = {snapshot.snapshot_id for snapshot in keep}
+        removed = 0
+
+        for snapshot in snapshots:
+            if snapshot.snapshot_id not in keep_ids:
+                with suppress(OSError):
+                    self.get_snapshot_path(snapshot.snapshot_id).unlink()
+                    removed += 1
+
+        self.__collect_garbage(keep_ids)
+        return removed
+
+    def __collect_garbage(self, snapshot_ids: Set[str]) -> None:
+        """
+        Removes all chunks none of the given snapshots refers to.
+        """
+
+        referenced = set()
+
+        for snapshot_id in snapshot_ids:
+            try:
+                referenced.update(self.__read_manifest(snapshot_id)["chunks"])
+            except (OSError, ValueError, KeyError):
+                # Better keep unreferenced chunks than remove chunks of a snapshot which could not be read
+                return
+
+        for directory in self.__dir_chunks.iterdir():
+            for chunk in directory.iterdir():
+                if chunk.name not in referenced:
+                    with suppress(OSError):
+                        chunk.unlink()
+
+    def __put_chunk(self, chunk: bytes) -> str:
+        chunk_id = blake2b(chunk, digest_size=16).hexdigest()
+        chunk_path = self.__get_chunk_path(chunk_id)
+
+        if not chunk_path.exists():
+            chunk_path.parent.mkdir(exist_ok=True)
+            _write_atomically(chunk_path, zlib.compress(chunk))
+
+        return chunk_id
+
+    def __get_chunk(self, chunk_id: str) -> bytes:
+        try:
+            chunk = zlib.decompress(self.__get_chunk_path(chunk_id).read_bytes())
+        except zlib.error as e:
+            raise ValueError("Chunk damaged", chunk_id) from e
+
+        if blake2b(chunk, digest_size=16).hexdigest() != chunk_id:
+            raise ValueError("Chunk damaged", chunk_id)
+        return chunk
+
+    def __read_manifest(self, snapshot_id: str) -> dict:
+        with self.get_snapshot_path(snapshot_id).open("r", encoding="utf-8") as file:
+            manifest = json.load(file)
+
+        if manifest.get("version") != _STORE_VERSION:
+            raise ValueError("Snapshot version not supported", snapshot_id)
+        return manifest
+
+    def __get_chunk_path(self, chunk_id: str) -> Path:
+        return self.__dir_chunks / chunk_id[:2] / chunk_id
+
+
+def _iter_lines(file_content: Iterable[str]) -> Iterator[bytes]:
+    """
+    Encodes the file content piece by piece and splits it into lines the same way bytes.splitlines does.
+    """
+
+    rest = b""
+
+    for piece in file_content:
+        lines = (rest + piece.encode("utf-8")).splitlines(keepends=True)
+
+        # The last line may continue in the next piece, even a line ending with '\r' if '\n' follows
+        rest = lines.pop() if lines and not lines[-1].endswith(b"\n") else b""
+        yield from lines
+
+    if rest:
+        yield from rest.splitlines(keepends=True)
+
+
+def _split_into_chunks(lines: Iterable[bytes]) -> Iterator[List[bytes]]:
+    """
+    Splits the lines of a document into chunks using content defined boundaries.
+    """
+
+    chunk = []
+
+    for line in lines:
+        chunk.append(line)
+        if line == _CHUNK_HEADER_END \
+                or zlib.crc32(line) & _CHUNK_BOUNDARY_MASK == 0 \
+                or len(chunk) >= _CHUNK_MAX_LINES:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def _parse_snapshot_name(file_name: str) -> Optional[Snapshot]:
+    if not file_name.endswith(_SNAPSHOT_SUFFIX):
+        return None
+
+    # The time itself contains dashes, it ends after the microseconds
+    snapshot_id = file_name[:-len(_SNAPSHOT_SUFFIX)]
+    time, video_name = snapshot_id[:_SNAPSHOT_TIME_LENGTH], snapshot_id[_SNAPSHOT_TIME_LENGTH + 1:]
+
+    try:
+        return Snapshot(snapshot_id, datetime.strptime(time, _SNAPSHOT_TIME_FORMAT), video_name)
+    except ValueError:
+        return None
+
+
+def _write_atomically(file_path: Path, data: bytes) -> None:
+    tmp_path = file_path.with_name(".{}.{}.tmp".format(file_path.name, token_hex(4)))
+
+    try:
+        with tmp_path.open("xb") as file:
+            file.write(data)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        with suppress(OSError):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,183 @@
+# mpvQC
+#
+# Copyright (C) 2020 mpvQC developers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import marshal
+import os
+import zlib
+from functools import partial
+from hashlib import sha1
+from importlib.util import MAGIC_NUMBER
+from os import path
+from pathlib import Path
+from typing import Optional, Tuple, NamedTuple
+
+from mpvqc import get_app_paths
+from mpvqc.qc import Comment, _new_tuple
+
+# Bump whenever the way documents are parsed or entries are written changes to invalidate all existing entries
+_CACHE_VERSION = 2
+
+# Entries are written by marshal, whose format may change between interpreter versions
+_CACHE_INTERPRETER = MAGIC_NUMBER
+
+# Entries start with the checksum of their remaining bytes
+_CHECKSUM_SIZE = 4
+
+# If all entries together exceed this size, least recently used entries are removed
+_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+_CACHE_SUFFIX = ".entry"
+
+# Entries store all fields of a comment including its milliseconds, so comments are built without parsing their time
+_new_comment = partial(_new_tuple, Comment)
+
+
+class CacheKey(NamedTuple):
+    """Identifies the content of a document on disk"""
+
+    path: str
+    size: int
+    mtime_ns: int
+
+
+def get_key(document_path: str) -> Optional[CacheKey]:
+    """
+    Returns the cache key of the document.
+
+    :param document_path: the path of the document
+    :return: the key or None if the document can not be accessed
+    """
+
+    try:
+        stat = os.stat(document_path)
+    except OSError:
+        return None
+    return CacheKey(path.abspath(document_path), stat.st_size, stat.st_mtime_ns)
+
+
+def get_document(key: Optional[CacheKey]) -> Optional[Tuple[Optional[str], Tuple[Comment]]]:
+    """
+    Returns the cached content of a document.
+
+    :param key: the key of the document
+    :return: the video path and all comments of the document or None if there is no valid entry
+    """
+
+    if key is None:
+        return None
+
+    entry = __get_entry_path(key)
+
+    try:
+        content = entry.read_bytes()
+        checksum, content = content[:_CHECKSUM_SIZE], content[_CHECKSUM_SIZE:]
+        if int.from_bytes(checksum, "big") != zlib.crc32(content):
+            return None
+        version, interpreter, document_path, video_path, comments = marshal.loads(content)
+        if version != _CACHE_VERSION or interpreter != _CACHE_INTERPRETER or document_path != key.path:
+            return None
+        comments = tuple(map(_new_comment, comments))
+    except (OSError, EOFError, ValueError, TypeError):
+        # Entries which can not be read, are cut off, damaged or of an unknown layout are treated as missing
+        return None
+
+    # Mark the entry as recently used
+    try:
+        os.utime(entry)
+    except OSError:
+        pass
+
+    return video_path, comments
+
+
+def put_document(key: Optional[CacheKey], video_path: Optional[str], comments: Tuple[Comment]) -> None:
+    """
+    Caches the content of a document. Replaces older entries of the same document.
+
+    :param key: the key of the document when it was read
+    :param video_path: the video path of the document
+    :param comments: all comments of the document
+    """
+
+    if key is None:
+        return
+
+    entry = __get_entry_path(key)
+    entry_tmp = entry.with_suffix(".tmp")
+
+    content = marshal.dumps((_CACHE_VERSION, _CACHE_INTERPRETER, key.path, video_path, tuple(map(tuple, comments))))
+
+    try:
+        with entry_tmp.open("wb") as file:
+            file.write(zlib.crc32(content).to_bytes(_CHECKSUM_SIZE, "big"))
+            file.write(content)
+        os.replace(entry_tmp, entry)
+    except OSError:
+        pass
+
+
+def evict() -> None:
+    """
+    Removes older entries of documents cached again and the least recently used entries
+    until all entries fit into the cache.
+    This reads the whole cache directory, so it is called once after all documents of an import were cached.
+    """
+
+    try:
+        with os.scandir(get_app_paths().dir_cache) as it:
+            entries = [(entry.stat(), entry.path) for entry in it if entry.name.endswith(_CACHE_SUFFIX)]
+    except OSError:
+        return
+
+    # Entries of a document share a prefix, only the last cached or used one is up to date
+    entries.sort(key=lambda e: e[0].st_mtime_ns, reverse=True)
+    prefixes = set()
+    kept = []
+
+    for stat, entry in entries:
+        prefix = path.basename(entry).partition("-")[0]
+        if prefix in prefixes:
+            __remove(entry)
+        else:
+            prefixes.add(prefix)
+            kept.append((stat, entry))
+
+    total = sum(stat.st_size for stat, _ in kept)
+
+    if total > _CACHE_MAX_BYTES:
+        for stat, entry in reversed(kept):
+            __remove(entry)
+            total -= stat.st_size
+            if total <= _CACHE_MAX_BYTES * 3 // 4:
+                break
+
+
+def __get_entry_prefix(key: CacheKey) -> str:
+    return sha1(key.path.encode("utf-8", "surrogateescape")).hexdigest()
+
+
+def __get_entry_path(key: CacheKey) -> Path:
+    file_name = "{}-{}-{}{}".format(__get_entry_prefix(key), key.size, key.mtime_ns, _CACHE_SUFFIX)
+    return get_app_paths().dir_cache / file_name
+
+
+def __remove(entry: str) -> None:
+    try:
+        os.remove(entry)
+    except OSError:
+        pass
@@ -0,0 +1,136 @@
+# mpvQC
+#
+# Copyright (C) 2020 mpvQC developers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from operator import attrgetter
+from typing import Optional, Tuple, Dict, Iterator, TYPE_CHECKING
+
+from mpvqc.qc import Comment
+
+if TYPE_CHECKING:
+    from mpvqc.ui.contentmaintablemodel import ContentMainTableModel
+
+_COMMENT_MILLISECONDS = attrgetter("comment_milliseconds")
+
+# The revision of a collection which does not match any table content
+_REVISION_STALE = -1
+
+# The content hash is the sum of the hashes of all comments, thereby independent of their order
+_HASH_MASK = (1 << 64) - 1
+
+
+class CommentCollection:
+    """
+    The comments of the comment table keyed by row id, kept up to date by row deltas.
+
+    The revision of the collection is the revision of the table model it matches. As long as all deltas are applied
+    in order, the collection never needs to read the whole table. A sorted tuple of all comments is only built
+    on request and kept until the next change.
+
+    The content hash of the collection is updated with each delta as well. Equal contents always have equal hashes,
+    so contents with different hashes can be told apart without comparing them. As the hash of strings differs
+    between processes, content hashes must never be persisted.
+    """
+
+    def __init__(self):
+        # Dictionaries keep the insertion order, comments of equal time thereby keep the order of the table
+        self.__comments: Dict[int, Comment] = {}
+        self.__revision = 0
+        self.__hash = 0
+        self.__snapshot: Optional[Tuple[Comment]] = ()
+
+    def __len__(self) -> int:
+        return len(self.__comments)
+
+    def __iter__(self) -> Iterator[Comment]:
+        """
+        Iterates over all comments in no particular order.
+        """
+
+        return iter(self.__comments.values())
+
+    @property
+    def revision(self) -> int:
+        """Returns the revision of the table model the collection matches"""
+
+        return self.__revision
+
+    @property
+    def content_hash(self) -> int:
+        """Returns a hash of all comments which does not depend on their order"""
+
+        return self.__hash
+
+    def apply(self, rows: Dict[int, Optional[Comment]], base_revision: int, revision: int) -> None:
+        """
+        Applies the changes of some rows.
+
+        :param rows: the new comment of each inserted or changed row by row id, None if the row was deleted
+        :param base_revision: the revision of the table model before the changes, -1 if rows misses changes
+        :param revision: the revision of the table model after the changes
+        """
+
+        comments = self.__comments
+        content_hash = self.__hash
+
+        for row_id, comment in rows.items():
+            current = comments.get(row_id)
+
+            if current is not None:
+                content_hash -= hash(current)
+
+            if comment is None:
+                comments.pop(row_id, None)
+            else:
+                if current is not None and current.comment_milliseconds != comment.comment_milliseconds:
+                    # The table moves a row behind all rows of the same time, so does the collection
+                    del comments[row_id]
+                comments[row_id] = comment
+                content_hash += hash(comment)
+
+        self.__hash = content_hash & _HASH_MASK
+        self.__snapshot = None
+
+        # Changes happened which were not applied, e.g. while the table was filled
+        missed_changes = base_revision == _REVISION_STALE or base_revision != self.__revision
+        self.__revision = _REVISION_STALE if missed_changes else revision
+
+    def sync(self, model: "ContentMainTableModel") -> bool:
+        """
+        Replaces all comments by the content of the table model, unless the collection already matches it.
+
+        :param model: the model of the comment table
+        :return: True if the comments were replaced, False if the collection was up to date
+        """
+
+        if self.__revision == model.revision:
+            return False
+
+        self.__comments = dict(zip(model.get_row_ids(), model.get_all_comments()))
+        self.__revision = model.revision
+        self.__hash = sum(map(hash, self.__comments.values())) & _HASH_MASK
+        self.__snapshot = None
+        return True
+
+    def snapshot(self) -> Tuple[Comment]:
+        """
+        Returns all comments sorted by time. The same tuple is returned until the collection changes.
+        """
+
+        if self.__snapshot is None:
+            self.__snapshot = tuple(sorted(self.__comments.values(), key=_COMMENT_MILLISECONDS))
+        return self.__snapshot
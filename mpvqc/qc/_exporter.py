@@ -16,23 +16,33 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import os
+import shutil
+from contextlib import suppress
 from datetime import datetime
-from os import linesep, path
-from typing import Optional, Tuple
-from zipfile import ZipFile, ZIP_DEFLATED
+from os import path
+from secrets import token_hex
+from typing import Optional, Tuple, Iterable, Iterator
 
-from mpvqc import get_settings, get_app_paths, get_app_metadata
+from mpvqc import get_settings, get_app_metadata
 from mpvqc.qc import Comment
+from mpvqc.qc._backupstore import BackupStore
 
+# Buffer size of the file object used to write qc documents
+_WRITE_BUFFER_SIZE = 1024 * 1024
 
-def __prepare_file_content(b_header: bool,
-                           b_date: bool, v_date: str,
-                           b_generator: bool, v_generator: str,
-                           b_nick: bool, v_nick: str,
-                           b_path: bool, v_path: str,
-                           comments: Tuple[Comment]):
+# Amount of comment lines rendered at once while streaming the file content
+_WRITE_CHUNK_SIZE = 4096
+
+
+def __iter_file_content(b_header: bool,
+                        b_date: bool, v_date: str,
+                        b_generator: bool, v_generator: str,
+                        b_nick: bool, v_nick: str,
+                        b_path: bool, v_path: str,
+                        comments: Tuple[Comment]) -> Iterator[str]:
     """
-    Builds the qc file content using the given arguments.
+    Yields the qc file content piece by piece using the given arguments.
 
     :param b_header: True, if write header, False else.
     :param b_date: True, if write date, False else.
@@ -44,35 +54,41 @@ def __prepare_file_content(b_header: bool,
     :param b_path: True, if write path, False else.
     :param v_path: the video path as string
     :param comments: a list of comments objects
-    :return: the file content of the qc document as a string
+    :return: an iterator over the file content of the qc document
     """
 
+    yield "[FILE]\n"
+
     if b_header:
-        d_date = "date      : {0}\n".format(v_date) if b_date else ""
-        d_gnrt = "generator : {0}\n".format(v_generator) if b_generator else ""
-        d_nick = "nickname  : {0}\n".format(v_nick) if b_nick else ""
-        d_path = "path      : {0}\n".format(v_path) if b_path else ""
-        d_header = "{0}{1}{2}{3}".format(d_date, d_gnrt, d_nick, d_path)
-    else:
-        d_header = ""
+        if b_date:
+            yield "date      : {0}\n".format(v_date)
+        if b_generator:
+            yield "generator : {0}\n".format(v_generator)
+        if b_nick:
+            yield "nickname  : {0}\n".format(v_nick)
+        if b_path:
+            yield "path      : {0}\n".format(v_path)
+
+    yield "\n[DATA]\n"
+
+    for start in range(0, len(comments), _WRITE_CHUNK_SIZE):
+        yield "\n".join(map(str, comments[start:start + _WRITE_CHUNK_SIZE]))
+        yield "\n"
 
-    comments_joined = "\n".join(map(lambda c: str(c), comments))
-    comments_size = len(comments)
+    if not comments:
+        yield "\n"
 
-    return ("[FILE]\n"
-            "{0}\n"
-            "[DATA]\n"
-            "{1}\n"
-            "# total lines: {2}").format(d_header, comments_joined, comments_size)
+    yield "# total lines: {0}".format(len(comments))
 
 
-def get_file_content(video_path: Optional[str], comments: Tuple[Comment]):
+def iter_file_content(video_path: Optional[str], comments: Tuple[Comment]) -> Iterator[str]:
     """
-    Will take into account all user settings provided as arguments to build and return the qc file content.
+    Will take into account all user settings provided as arguments to build the qc file content.
+    Settings are read immediately, the content is built while iterating.
 
     :param video_path: the path of the video
     :param comments: a list of comments objects
-    :return: the file content of the qc document as a string
+    :return: an iterator over the file content of the qc document
     """
 
     metadata = get_app_metadata()
@@ -92,43 +108,81 @@ def get_file_content(video_path: Optional[str], comments: Tuple[Comment]):
     b_path = s.export_write_path
     v_path = video_path if video_path else ""
 
-    return __prepare_file_content(b_header,
-                                  b_date, v_date,
-                                  b_generator, v_generator,
-                                  b_nick, v_nick,
-                                  b_path, v_path,
-                                  comments)
+    return __iter_file_content(b_header,
+                               b_date, v_date,
+                               b_generator, v_generator,
+                               b_nick, v_nick,
+                               b_path, v_path,
+                               comments)
 
 
-def write_qc_document(file_path, file_content):
+def write_qc_document(file_path: str, file_content: Iterable[str]) -> None:
     """
     Writes a qc file to disk.
+    The content is streamed into a temporary file next to the target which then atomically replaces the target.
+    Both the file and its directory are synced to disk. The target remains untouched if writing fails.
 
     :param file_path: the file path to write
-    :param file_content: the content to write
+    :param file_content: the content to write, e.g. from iter_file_content
+    """
+
+    file_path = path.realpath(file_path)
+    directory, file_name = path.split(file_path)
+    tmp_path = path.join(directory, ".{}.{}.tmp".format(file_name, token_hex(4)))
+
+    try:
+        with open(tmp_path, "x", encoding="utf-8", buffering=_WRITE_BUFFER_SIZE) as f:
+            f.writelines(file_content)
+            f.flush()
+            os.fsync(f.fileno())
+
+        if path.exists(file_path):
+            with suppress(OSError):
+                shutil.copymode(file_path, tmp_path)
+
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        with suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+    __sync_directory(directory)
+
+
+def __sync_directory(directory: str) -> None:
+    """
+    Syncs the directory to disk, so a file replaced in it is still replaced after a crash.
+    Directories can not be opened on Windows, there the directory is left to the file system.
+
+    :param directory: the directory to sync
     """
 
-    with open(file_path, "w", encoding="utf-8") as f:
-        f.write(file_content)
+    if os.name == "nt":
+        return
+
+    # The document is written at this point, failing to sync the directory must not report it as lost
+    with suppress(OSError):
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
 
 
-def write_auto_save(video_path, file_content):
+def write_auto_save(video_path: str, file_content: Iterable[str]) -> None:
     """
-    Writes a qc file into the auto save zip.
+    Writes a qc file into the backup store. Afterwards backups beyond the retention limits are removed,
+    if any limit is set. By default backups are kept forever.
 
     :param video_path: the name of the current video file
-    :param file_content: the content to write
+    :param file_content: the content to write, e.g. from iter_file_content
     """
 
-    today = str(datetime.today())
-
-    zip_name = "{}.zip".format("-".join(today.split("-")[:2]))
-    zip_path = path.join(get_app_paths().dir_backup, zip_name)
-    zip_file = ZipFile(zip_path, "a" if path.isfile(zip_path) else "w", compression=ZIP_DEFLATED)
+    s = get_settings()
+    max_age_days, max_count = s.auto_save_max_age, s.auto_save_max_count
 
-    file_name = "{}-{}.txt".format(today.replace(":", "-").replace(" ", "_"), path.splitext(path.basename(video_path))[0])
+    store = BackupStore()
+    store.add_snapshot(video_path, file_content)
 
-    try:
-        zip_file.writestr(file_name, file_content)
-    finally:
-        zip_file.close()
+    if max_age_days > 0 or max_count > 0:
+        store.apply_retention(max_age_days=max_age_days, max_count=max_count)
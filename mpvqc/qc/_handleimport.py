@@ -112,7 +112,21 @@ def do_import(
         cur_vid: Optional[str],
         imp_docs: Optional[List[str]],
         imp_vids: Optional[List[str]],
+        max_workers: int = 1,
+        content: Optional[Tuple[List[str], Tuple[Comment], List[str], List[str]]] = None,
 ) -> Tuple[HandleImportResult, HandleImportResultData]:
+    """
+    Imports the given documents and videos.
+
+    :param cur_vid: the currently opened video
+    :param imp_docs: the documents to import
+    :param imp_vids: the videos to import
+    :param max_workers: the maximum amount of processes parsing documents, only used if content is None
+    :param content: the content of the documents if they were read already, see _importer.get_qc_content
+    :return: the result of the import
+    """
+
+
     doc_new: Optional[str] = None
     vid_new_from_docs: Optional[str] = None
     vid_new_from_user: Optional[str] = None
@@ -121,7 +135,10 @@ def do_import(
     docs_invalid: Optional[List[str]] = None
 
     if imp_docs:
-        videos, comments, docs_valid, docs_invalid = _importer.get_qc_content(imp_docs)
+        if content is None:
+            content = _importer.get_qc_content(imp_docs, max_workers)
+
+        videos, comments, docs_valid, docs_invalid = content
 
         if videos:
             vid_new_from_docs = videos[0]
@@ -43,7 +43,7 @@ def do_save(
     if not doc:
         return HandleSaveResult(abort=True)
 
-    content = _exporter.get_file_content(vid, comments)
+    content = _exporter.iter_file_content(vid, comments)
 
     # noinspection PyBroadException
     try:
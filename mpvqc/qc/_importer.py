@@ -16,65 +16,168 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
-import re
-from os import path
+import multiprocessing
+from codecs import BOM_UTF8
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import chain
+from operator import attrgetter
+from os import path, cpu_count
 from typing import Optional, List, Tuple
 
-from mpvqc.qc import Comment
-from mpvqc.utils import replace_special_characters
+from mpvqc.qc import Comment, _cache
+from mpvqc.qc._parser import ParsedDocument, parse_document, QC_DOCUMENT_HEADER
 
-_REGEX_PATH = re.compile("^path\s*:*\s*")
-_REGEX_LINE = re.compile("^\[\d{2}:\d{2}:\d{2}\]\s*\[[^\[\]]*\]\s*.*$")
+_COMMENT_MILLISECONDS = attrgetter("comment_milliseconds")
 
-# Used to find the first two columns
-_REGEX_COLUMN = re.compile("\[[^\[\]]*\]")
+# Amount of bytes read to decide whether a file can be a qc document at all
+_SNIFF_SIZE = 512
 
-# If a file is a valid qc document is determined if line (stripped) 1 starts with '[FILE]'.
-QC_DOCUMENT_HEADER = "[FILE]"
+# Starting worker processes takes longer than parsing a few small documents in the main process
+_POOL_MIN_DOCUMENTS = 16
+_POOL_MIN_BYTES = 16 * 1024 * 1024
 
 
-def __find_path(line):
+def __sniff_document(document_path: str) -> bool:
     """
-    Checks whether line is a line.
+    Checks whether the file can be a qc document by only looking at its first bytes.
 
-    :param line: the line to check
-    :return: the video path if found, None else.
+    :param document_path: the path of the file
+    :return: False if the file is no qc document, True if it needs to be parsed to decide
     """
 
-    match = _REGEX_PATH.match(line)
-    if match is not None:
-        qc_vid_path = line.replace(match.group(), "").strip()
-        return qc_vid_path
-    return None
+    with open(document_path, "rb") as file:
+        head = file.read(_SNIFF_SIZE)
 
+    whole_file = len(head) < _SNIFF_SIZE
 
-def __find_comment(line):
+    if head.startswith(BOM_UTF8):
+        head = head[len(BOM_UTF8):]
+
+    text = head.decode("utf-8", errors="replace")
+    first_line = text.split("\n", 1)[0].split("\r", 1)[0]
+    complete = whole_file or len(first_line) < len(text)
+
+    stripped = first_line.strip()
+    return stripped.startswith(QC_DOCUMENT_HEADER) or (not complete and QC_DOCUMENT_HEADER.startswith(stripped))
+
+
+def __is_worth_a_pool(document_paths: List[str]) -> bool:
+    """
+    Returns True if the documents are many or large enough to parse them in worker processes, False else.
+    """
+
+    if len(document_paths) >= _POOL_MIN_DOCUMENTS:
+        return True
+
+    total_size = 0
+    for document_path in document_paths:
+        try:
+            total_size += path.getsize(document_path)
+        except OSError:
+            pass
+    return total_size >= _POOL_MIN_BYTES
+
+
+def __get_pool_context():
+    """
+    Returns the context worker processes are started with. The application is never forked, as it runs threads of
+    Gtk and mpv. The fork server only preloads the parser, which does not import Gtk.
+    """
+
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([parse_document.__module__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def __parse_documents(document_paths: List[str], max_workers: int) -> List[ParsedDocument]:
+    """
+    Parses the given documents. Spreads the work over a process pool if more than one worker is allowed and
+    there are many or large documents.
+
+    :param document_paths: the paths of the qc documents
+    :param max_workers: the maximum amount of worker processes, 0 to use the number of processors
+    :return: the parsed documents in the same order as the given paths
+    """
+
+    workers = min(max_workers or cpu_count() or 1, len(document_paths))
+
+    if workers > 1 and __is_worth_a_pool(document_paths):
+        chunk_size = max(1, len(document_paths) // (workers * 4))
+
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=__get_pool_context()) as executor:
+                return list(executor.map(parse_document, document_paths, chunksize=chunk_size))
+        except (ImportError, OSError, BrokenProcessPool, ValueError):
+            # Process pools may be unavailable (e.g. in sandboxes without shared memory or semaphores), a worker died
+            # or a document could not be read or decoded: fall back to the main process,
+            # which reports errors of single documents as usual
+            pass
+
+    return [parse_document(document_path) for document_path in document_paths]
+
+
+def __read_documents(document_paths: List[str], max_workers: int) -> List[ParsedDocument]:
     """
-    Checks whether line is a comment.
+    Returns the content of the given documents.
+    Only documents which are not cached or changed since and which start like a qc document are parsed.
 
-    :param line: the line to check
-    :return: a comment object if line is comment, None else
+    :param document_paths: the paths of the qc documents
+    :param max_workers: the maximum amount of worker processes, 0 to use the number of processors
+    :return: the documents in the same order as the given paths
     """
 
-    match = _REGEX_LINE.match(line)
-    if match is not None:
-        time_braces = _REGEX_COLUMN.search(line).group(0)
-        line = line.replace(time_braces, "", 1)
-        time = time_braces[1:-1]
+    keys = [_cache.get_key(document_path) for document_path in document_paths]
+    documents = []
+
+    for document_path, key in zip(document_paths, keys):
+        cached = _cache.get_document(key)
+        if cached is not None:
+            documents.append(ParsedDocument(True, *cached))
+        elif not __sniff_document(document_path):
+            documents.append(ParsedDocument(valid=False))
+        else:
+            documents.append(None)
+
+    missing = [idx for idx, document in enumerate(documents) if document is None]
+    parsed = __parse_documents([document_paths[idx] for idx in missing], max_workers)
+
+    for idx, document in zip(missing, parsed):
+        documents[idx] = document
+        if document.valid:
+            _cache.put_document(keys[idx], document.video_path, document.comments)
 
-        coty_braces = _REGEX_COLUMN.search(line).group(0)
-        line = line.replace(coty_braces, "", 1)
-        coty = coty_braces[1:-1]
+    if missing:
+        _cache.evict()
 
-        return Comment(time, coty, replace_special_characters(line.strip()))
-    return None
+    return documents
 
 
-def get_qc_content(document_paths: Optional[List[str]]) -> Tuple[List[str], Tuple[Comment], List[str], List[str]]:
+def __merge_comments(comment_streams: List[Tuple[Comment]]) -> Tuple[Comment]:
+    """
+    Merges the comments of multiple documents into one tuple sorted by time.
+
+    Documents are almost always sorted by time already. Timsort detects every sorted document as a run and merges
+    these runs which costs O(total * log(documents)). Documents which are not sorted are sorted as part of that.
+
+    :param comment_streams: the comments of each document in document order
+    :return: all comments sorted by time, comments with equal time keep their document order
+    """
+
+    return tuple(sorted(chain.from_iterable(comment_streams), key=_COMMENT_MILLISECONDS))
+
+
+def get_qc_content(
+        document_paths: Optional[List[str]],
+        max_workers: int = 1
+) -> Tuple[List[str], Tuple[Comment], List[str], List[str]]:
     """
     Reads qc information from the given paths.
 
     :param document_paths: a list with file paths pointing to existing qc document files.
+    :param max_workers: the maximum amount of processes parsing documents in parallel, 0 to use the number of processors
     :return: four lists:<br>
         - video_paths: all found video paths<br>
         - combined_comments: all combined comments from all provided files<br>
@@ -82,33 +185,23 @@ def get_qc_content(document_paths: Optional[List[str]]) -> Tuple[List[str], Tupl
         - non_valid_files: all files considered not valid
     """
 
-    video_paths, combined_comments, valid_files, non_valid_files = [], [], [], []
-
-    for document_path in document_paths:
-        with open(document_path, "r", encoding="utf-8-sig") as file:
-            lines = [x.strip() for x in file.readlines() if x]
+    video_paths, comment_streams, valid_files, non_valid_files = [], [], [], []
 
-        video_path_found = False
+    documents = __read_documents(document_paths, max_workers)
 
-        if len(lines) > 0 and lines[0].startswith(QC_DOCUMENT_HEADER):
+    for document_path, document in zip(document_paths, documents):
+        if document.valid:
             valid_files.append(document_path)
-            for line in lines:
-                if not video_path_found:
-                    video_path = __find_path(line)
-                    if video_path:
-                        video_paths.append(video_path)
-                        video_path_found = True
-
-                comment = __find_comment(line)
-                if comment:
-                    combined_comments.append(comment)
+            if document.video_path:
+                video_paths.append(document.video_path)
+            comment_streams.append(document.comments)
         else:
             non_valid_files.append(document_path)
 
     # Return only existing paths
     video_paths = [p for p in video_paths if p and path.exists(p)]
 
-    # Sort comments by time
-    combined_comments = tuple(sorted(combined_comments, key=lambda x: x.comment_time))
+    # Merge comments by time
+    combined_comments = __merge_comments(comment_streams)
 
     return video_paths, combined_comments, valid_files, non_valid_files
@@ -0,0 +1,393 @@
+# mpvQC
+#
+# Copyright (C) 2020 mpvQC developers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import json
+import os
+from operator import attrgetter
+from pathlib import Path
+from queue import Queue
+from threading import Thread
+from typing import Optional, NamedTuple, Tuple, List, Callable, Iterator, TYPE_CHECKING
+
+from gi.repository import GLib, Gtk
+
+from mpvqc import get_app_paths
+from mpvqc.qc import Comment
+
+if TYPE_CHECKING:
+    from mpvqc.ui.contentmaintablemodel import ContentMainTableModel
+
+# Bump whenever the record layout changes, journals of other versions are ignored
+_JOURNAL_VERSION = 1
+
+_JOURNAL_NAME = "journal"
+
+# Records are written immediately but synced to disk at most once per interval ...
+_SYNC_INTERVAL_MS = 1000
+
+# ... or as soon as this many records are waiting
+_SYNC_BATCH_SIZE = 256
+
+# If this many records were appended since the last checkpoint, the journal is compacted
+_COMPACT_RECORDS = 20000
+
+# Record types, a journal always starts with a checkpoint
+_CHECKPOINT = "c"
+_INSERT = "i"
+_UPDATE = "u"
+_DELETE = "d"
+_STATE = "s"
+
+
+class JournalContent(NamedTuple):
+    """The content recovered from a journal"""
+
+    # The document path at the last checkpoint
+    doc: Optional[str]
+
+    # The video path at the last checkpoint
+    vid: Optional[str]
+
+    # All comments after replaying every record, sorted by time
+    comments: Tuple[Comment]
+
+    # True if the comments differ from what was saved at the last checkpoint
+    has_changes: bool
+
+
+class Journal:
+    """
+    Records every insert, update and delete of the comment table in an append-only file.
+
+    The journal starts with a checkpoint holding all rows of the table, each following line holds a single change
+    of a row or of the document path, the video path and whether there are unsaved changes.
+    Rows are identified by the row id of the table model since neither position nor content is unique.
+    Records are synced to disk in batches. A checkpoint replaces the whole journal and thereby compacts it.
+    Records and checkpoints are encoded and written by a worker thread in the order they were requested,
+    the main loop only copies the table content.
+    """
+
+    def __init__(self, model: "ContentMainTableModel", journal_path: Optional[Path] = None):
+        """
+        :param model: the model of the comment table
+        :param journal_path: the file to write the journal to
+        """
+
+        self.__model = model
+        self.__path = journal_path or get_journal_path()
+
+        # Row ids in the order of the model rows, required to tell which row was deleted
+        self.__row_ids: List[int] = []
+
+        self.__doc: Optional[str] = None
+        self.__vid: Optional[str] = None
+        self.__has_changes = False
+        self.__started = False
+        self.__paused = True
+        self.__records_unsynced = 0
+        self.__records_since_checkpoint = 0
+        self.__sync_source = None
+
+        # The revision of the table model after the last change the journal recorded
+        self.__revision = -1
+
+        # Only accessed by the worker thread
+        self.__file = None
+
+        self.__tasks: "Queue[Tuple[Callable, tuple]]" = Queue()
+        Thread(target=self.__run, name="mpvqc-journal", daemon=True).start()
+
+        model.connect("row-inserted", self.__on_row_inserted)
+        model.connect("row-changed", self.__on_row_changed)
+        model.connect("row-deleted", self.__on_row_deleted)
+        model.connect("rows-reordered", self.__on_rows_reordered)
+
+    def pause(self) -> None:
+        """
+        Stops recording changes until the next checkpoint, e.g. while the whole table is replaced.
+        """
+
+        self.__paused = True
+
+    def is_up_to_date(self) -> bool:
+        """
+        Returns True if the journal recorded every change of the table, False if it missed changes, e.g. while paused.
+        """
+
+        return self.__started and self.__revision == self.__model.revision
+
+    def record_state(self, doc: Optional[str], vid: Optional[str], has_changes: bool) -> None:
+        """
+        Records the document path, the video path and whether there are unsaved changes if any of them changed,
+        and continues recording changes after a pause. Requires the journal to be up to date.
+
+        :param doc: the current document path
+        :param vid: the current video path
+        :param has_changes: True if the table content is not saved, False else
+        """
+
+        if not self.is_up_to_date():
+            return
+
+        self.__paused = False
+
+        if (doc, vid, has_changes) != (self.__doc, self.__vid, self.__has_changes):
+            self.__doc = doc
+            self.__vid = vid
+            self.__has_changes = has_changes
+            self.__append([_STATE, doc, vid, has_changes])
+
+    def checkpoint(self, doc: Optional[str], vid: Optional[str], has_changes: bool) -> None:
+        """
+        Replaces the journal by a single checkpoint holding the current table content and resumes recording.
+
+        :param doc: the current document path
+        :param vid: the current video path
+        :param has_changes: True if the table content is not saved, False else
+        """
+
+        self.__cancel_sync()
+
+        model = self.__model
+
+        self.__row_ids = model.get_row_ids()
+        self.__revision = model.revision
+        self.__doc = doc
+        self.__vid = vid
+        self.__has_changes = has_changes
+        self.__records_unsynced = 0
+        self.__records_since_checkpoint = 0
+        self.__started = True
+        self.__paused = False
+
+        self.__submit(self.__write_checkpoint, doc, vid, has_changes, model.get_rows())
+
+    def discard(self) -> None:
+        """
+        Stops recording and removes the journal, e.g. when the application is closed regularly.
+        Returns after the journal was removed.
+        """
+
+        self.__cancel_sync()
+        self.__started = False
+        self.__paused = True
+
+        self.__submit(self.__remove)
+        self.__tasks.join()
+
+    def __cancel_sync(self) -> None:
+        if self.__sync_source is not None:
+            GLib.source_remove(self.__sync_source)
+            self.__sync_source = None
+
+    def __on_row_inserted(self, model: "ContentMainTableModel", path: Gtk.TreePath, _: Gtk.TreeIter) -> None:
+        if self.__paused:
+            return
+
+        index = path.get_indices()[0]
+        row_id, c_time, c_type, c_note = model.get_row(index)
+        self.__row_ids.insert(index, row_id)
+        self.__append([_INSERT, row_id, c_time, c_type, c_note], model.revision)
+
+    def __on_row_changed(self, model: "ContentMainTableModel", path: Gtk.TreePath, _: Gtk.TreeIter) -> None:
+        if self.__paused:
+            return
+
+        row_id, c_time, c_type, c_note = model.get_row(path.get_indices()[0])
+        self.__append([_UPDATE, row_id, c_time, c_type, c_note], model.revision)
+
+    def __on_row_deleted(self, model: "ContentMainTableModel", path: Gtk.TreePath) -> None:
+        if self.__paused:
+            return
+
+        row_id = self.__row_ids.pop(path.get_indices()[0])
+        self.__append([_DELETE, row_id], model.revision)
+
+    def __on_rows_reordered(self, model: "ContentMainTableModel", *_) -> None:
+        if self.__paused:
+            return
+
+        # The new order is not accessible from Python, but reordering only happens after a time was edited
+        self.__row_ids = model.get_row_ids()
+
+    def __append(self, record: list, revision: Optional[int] = None) -> None:
+        """
+        :param record: the record to write
+        :param revision: the revision of the table model after a recorded change of a row
+        """
+
+        if revision is not None:
+            # Unsaved changes are implied by every recorded change of a row
+            self.__revision = revision
+            self.__has_changes = True
+
+        self.__submit(self.__write_record, record)
+
+        self.__records_unsynced += 1
+        self.__records_since_checkpoint += 1
+
+        if self.__records_unsynced >= _SYNC_BATCH_SIZE:
+            self.__sync()
+        elif self.__sync_source is None:
+            self.__sync_source = GLib.timeout_add(_SYNC_INTERVAL_MS, self.__on_sync_timeout)
+
+    def __on_sync_timeout(self) -> bool:
+        self.__sync_source = None
+
+        if self.__records_since_checkpoint >= _COMPACT_RECORDS:
+            self.checkpoint(self.__doc, self.__vid, self.__has_changes)
+        else:
+            self.__sync()
+        return False
+
+    def __sync(self) -> None:
+        self.__records_unsynced = 0
+        self.__submit(self.__sync_file)
+
+    def __submit(self, task: Callable, *args) -> None:
+        self.__tasks.put((task, args))
+
+    def __run(self) -> None:
+        tasks = self.__tasks
+
+        while True:
+            task, args = tasks.get()
+            try:
+                task(*args)
+            finally:
+                tasks.task_done()
+
+    def __write_checkpoint(self, doc: Optional[str], vid: Optional[str], has_changes: bool,
+                           rows: Iterator[Tuple[int, str, str, str]]) -> None:
+        self.__close()
+
+        checkpoint = [_CHECKPOINT, _JOURNAL_VERSION, doc, vid, has_changes, list(rows)]
+        temp_path = self.__path.with_name(".{}.tmp".format(self.__path.name))
+
+        try:
+            with temp_path.open("w", encoding="utf-8") as file:
+                file.write(json.dumps(checkpoint, ensure_ascii=False, separators=(",", ":")))
+                file.write("\n")
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.__path)
+            self.__file = self.__path.open("a", encoding="utf-8")
+        except OSError:
+            # Without a journal there is nothing to recover, but editing must go on
+            self.__file = None
+
+    def __write_record(self, record: list) -> None:
+        # Records are dropped until the next checkpoint if the journal could not be written
+        if self.__file is None:
+            return
+
+        try:
+            self.__file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+            self.__file.write("\n")
+        except OSError:
+            self.__close()
+
+    def __sync_file(self) -> None:
+        if self.__file is None:
+            return
+
+        try:
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+        except OSError:
+            self.__close()
+
+    def __remove(self) -> None:
+        self.__close()
+
+        try:
+            self.__path.unlink()
+        except OSError:
+            pass
+
+    def __close(self) -> None:
+        if self.__file is not None:
+            try:
+                self.__file.close()
+            except OSError:
+                pass
+            self.__file = None
+
+
+def get_journal_path() -> Path:
+    """
+    Returns the path of the journal of the application.
+    """
+
+    return get_app_paths().dir_config / _JOURNAL_NAME
+
+
+def read_journal(journal_path: Optional[Path] = None) -> Optional[JournalContent]:
+    """
+    Replays the journal on top of its checkpoint.
+    Reading stops at the first incomplete record, e.g. the one written while the application crashed.
+
+    :param journal_path: the journal to read
+    :return: the recovered content or None if there is no valid journal
+    """
+
+    journal_path = journal_path or get_journal_path()
+
+    try:
+        with journal_path.open("r", encoding="utf-8") as file:
+            lines = iter(file)
+
+            try:
+                checkpoint = json.loads(next(lines))
+                kind, version, doc, vid, has_changes, rows = checkpoint
+            except (StopIteration, ValueError):
+                return None
+
+            if kind != _CHECKPOINT or version != _JOURNAL_VERSION:
+                return None
+
+            # Dictionaries keep the insertion order, rows of equal time thereby keep their order
+            content = {row[0]: row[1:] for row in rows}
+
+            for line in lines:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+
+                kind = record[0]
+                if kind == _INSERT:
+                    content[record[1]] = record[2:]
+                elif kind == _UPDATE:
+                    # As in the table, a row whose time changed moves behind all rows of the same time
+                    previous = content.get(record[1])
+                    if previous is not None and previous[0] != record[2]:
+                        del content[record[1]]
+                    content[record[1]] = record[2:]
+                elif kind == _DELETE:
+                    content.pop(record[1], None)
+                elif kind == _STATE:
+                    doc, vid, has_changes = record[1:]
+                    continue
+                has_changes = True
+    except (OSError, UnicodeDecodeError):
+        return None
+
+    comments = (Comment(c_time, c_type, c_note) for c_time, c_type, c_note in content.values())
+    comments = tuple(sorted(comments, key=attrgetter("comment_milliseconds")))
+    return JournalContent(doc, vid, comments, has_changes)
@@ -0,0 +1,80 @@
+# mpvQC
+#
+# Copyright (C) 2020 mpvQC developers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Parsing of single qc documents. Runs in worker processes, so nothing in here may import Gtk, directly or indirectly.
+"""
+
+import re
+from typing import Optional, Tuple, NamedTuple
+
+from mpvqc.qc import Comment, replace_special_characters
+
+# Both patterns are applied to stripped lines
+_REGEX_PATH = re.compile(r"^path\s*:*\s*(?P<path>.*)$")
+_REGEX_COMMENT = re.compile(r"^\[(?P<time>\d{2}:\d{2}:\d{2})\]\s*\[(?P<type>[^\[\]]*)\]\s*(?P<note>.*)$")
+
+# If a file is a valid qc document is determined if line (stripped) 1 starts with '[FILE]'.
+QC_DOCUMENT_HEADER = "[FILE]"
+
+
+class ParsedDocument(NamedTuple):
+    """The content of a single qc document"""
+
+    # True if the document starts with the qc document header
+    valid: bool = False
+
+    # The first video path found in the document
+    video_path: Optional[str] = None
+
+    # All comments of the document in document order
+    comments: Tuple[Comment] = ()
+
+
+def parse_document(document_path: str) -> ParsedDocument:
+    """
+    Reads the given qc document line by line in a single pass.
+    Only the current line and the comments found so far are kept in memory, regardless of the document size.
+
+    :param document_path: the path of the qc document
+    :return: the parsed document
+    """
+
+    video_path = None
+    comments = []
+
+    match_comment = _REGEX_COMMENT.match
+    match_path = _REGEX_PATH.match
+    add_comment = comments.append
+
+    with open(document_path, "r", encoding="utf-8-sig") as file:
+        if not next(file, "").strip().startswith(QC_DOCUMENT_HEADER):
+            return ParsedDocument(valid=False)
+
+        for line in file:
+            line = line.strip()
+
+            match = match_comment(line)
+            if match is not None:
+                c_time, c_type, c_note = match.group("time", "type", "note")
+                add_comment(Comment(c_time, c_type, replace_special_characters(c_note)))
+            elif video_path is None:
+                match = match_path(line)
+                if match is not None:
+                    video_path = match.group("path") or None
+
+    return ParsedDocument(valid=True, video_path=video_path, comments=tuple(comments))
@@ -0,0 +1,218 @@
+# mpvQC
+#
+# Copyright (C) 2020 mpvQC developers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from array import array
+from bisect import bisect_left
+from time import monotonic
+from typing import Optional, Dict, Set, List, Callable, Any, TYPE_CHECKING
+
+from mpvqc.qc import Comment
+
+if TYPE_CHECKING:
+    from mpvqc.ui.contentmaintablemodel import ContentMainTableModel
+
+# Notes are indexed by all of their substrings of this length
+_GRAM_LENGTH = 3
+
+# Case insensitive patterns match these with 'i', case folding keeps them apart
+_FOLD_TABLE = str.maketrans({"İ": "i", "ı": "i"})
+
+# The revision of an index which does not match any table content
+_REVISION_STALE = -1
+
+_NO_ROWS = array("I")
+
+# While indexing missed notes, the time budget is checked after each chunk of this many notes
+_BUDGET_CHECK_NOTES = 16
+
+
+def _get_grams(text: str) -> Set[str]:
+    """
+    Returns all trigrams of the text with its case folded, so texts a case insensitive pattern matches
+    with each other have the same trigrams.
+    """
+
+    folded = text.translate(_FOLD_TABLE).casefold()
+    return {folded[i:i + _GRAM_LENGTH] for i in range(len(folded) - _GRAM_LENGTH + 1)}
+
+
+def _add_row(row_ids: array, row_id: int) -> None:
+    """
+    Inserts the row id into the sorted row ids. Row ids grow with each added row, so this mostly appends.
+    """
+
+    if not row_ids or row_ids[-1] < row_id:
+        row_ids.append(row_id)
+    else:
+        position = bisect_left(row_ids, row_id)
+        if position == len(row_ids) or row_ids[position] != row_id:
+            row_ids.insert(position, row_id)
+
+
+def _remove_row(row_ids: array, row_id: int) -> None:
+    """
+    Removes the row id from the sorted row ids.
+    """
+
+    position = bisect_left(row_ids, row_id)
+    if position < len(row_ids) and row_ids[position] == row_id:
+        del row_ids[position]
+
+
+class SearchIndex:
+    """
+    A trigram index over the notes of the comment table keyed by row id, kept up to date by row deltas.
+
+    A query of at least three characters is answered by intersecting the rows of all trigrams of the query,
+    only these candidates are searched. As the collection of comments, the index has the revision of the table model
+    it matches. Notes the index missed, e.g. while the table was filled, are indexed a chunk at a time by update.
+
+    The rows of each trigram are kept as a sorted array of 4 byte row ids. With 100k notes of 60 characters
+    on average the index holds about 5.8M row ids, which take about 36 MB including the arrays and the dicts.
+    """
+
+    def __init__(self):
+        self.__notes: Dict[int, str] = {}
+        self.__rows: Dict[str, array] = {}
+        self.__revision = 0
+
+        self.__pending_row_ids: List[int] = []
+        self.__pending_notes: List[str] = []
+        self.__pending_position = 0
+        self.__pending_revision = 0
+
+    @property
+    def revision(self) -> int:
+        """Returns the revision of the table model the index matches"""
+
+        return self.__revision
+
+    def apply(self, rows: Dict[int, Optional[Comment]], base_revision: int, revision: int) -> None:
+        """
+        Applies the changes of some rows.
+
+        :param rows: the new comment of each inserted or changed row by row id, None if the row was deleted
+        :param base_revision: the revision of the table model before the changes, -1 if rows misses changes
+        :param revision: the revision of the table model after the changes
+        """
+
+        if base_revision == _REVISION_STALE or base_revision != self.__revision:
+            # Left to update
+            self.__revision = _REVISION_STALE
+            return
+
+        for row_id, comment in rows.items():
+            self.__set_note(row_id, None if comment is None else comment.comment_note)
+
+        self.__revision = revision
+
+    def update(self, model: "ContentMainTableModel", budget: float) -> bool:
+        """
+        Indexes the notes which changed since the index matched the table model the last time.
+
+        :param model: the model of the comment table
+        :param budget: the time in seconds after which indexing stops and leaves the remaining rows for later
+        :return: True if the index matches the table model, False if rows are left to index
+        """
+
+        if self.__revision == model.revision:
+            return True
+
+        if self.__pending_revision != model.revision:
+            # The notes stay valid until the revision of the model changes, which starts over
+            self.__pending_row_ids = model.get_row_ids()
+            self.__pending_notes = model.get_notes()
+            self.__pending_position = 0
+            self.__pending_revision = model.revision
+            self.__revision = _REVISION_STALE
+
+        row_ids = self.__pending_row_ids
+        notes = self.__pending_notes
+        position = self.__pending_position
+        deadline = monotonic() + budget
+
+        while position < len(row_ids):
+            end = position + _BUDGET_CHECK_NOTES
+            for row_id, note in zip(row_ids[position:end], notes[position:end]):
+                self.__set_note(row_id, note)
+            position = end
+
+            if position < len(row_ids) and monotonic() >= deadline:
+                self.__pending_position = position
+                return False
+
+        # Each row of the model is indexed now, so more indexed rows means some were deleted
+        if len(self.__notes) > len(row_ids):
+            for row_id in self.__notes.keys() - set(row_ids):
+                self.__set_note(row_id, None)
+
+        self.__pending_row_ids = []
+        self.__pending_notes = []
+        self.__revision = self.__pending_revision
+        return True
+
+    def find(self, query: str, search: Callable[[str], Any]) -> Optional[Set[int]]:
+        """
+        Searches all notes containing each trigram of the query.
+
+        :param query: the text to search for, case insensitive
+        :param search: tells whether a note matches, e.g. the search method of a compiled pattern
+        :return: the row ids of all matching notes or None if the query is too short to be looked up
+        """
+
+        grams = _get_grams(query)
+
+        if not grams:
+            return None
+
+        rows = self.__rows
+        candidates = sorted((rows.get(gram, _NO_ROWS) for gram in grams), key=len)
+        notes = self.__notes
+
+        row_ids = set(candidates[0])
+        for other in candidates[1:]:
+            if not row_ids:
+                break
+            row_ids.intersection_update(other)
+
+        return {row_id for row_id in row_ids if search(notes[row_id])}
+
+    def __set_note(self, row_id: int, note: Optional[str]) -> None:
+        notes = self.__notes
+        rows = self.__rows
+
+        current = notes.get(row_id)
+        if current == note:
+            return
+
+        if current is not None:
+            del notes[row_id]
+            for gram in _get_grams(current):
+                row_ids = rows[gram]
+                _remove_row(row_ids, row_id)
+                if not row_ids:
+                    del rows[gram]
+
+        if note is not None:
+            notes[row_id] = note
+            for gram in _get_grams(note):
+                row_ids = rows.get(gram)
+                if row_ids is None:
+                    rows[gram] = array("I", (row_id,))
+                else:
+                    _add_row(row_ids, row_id)
@@ -94,3 +94,19 @@ def get_new_doc_m():
     """
 
     return _("Created new document")
+
+
+def get_restore_m(comments: int):
+    """
+    Returns a localized message to write the 'restored previous session' message in the statusbar
+    """
+
+    return _("Restored {} comments of the previous session").format(comments)
+
+
+def get_auto_save_failed_m():
+    """
+    Returns a localized message to write in the statusbar if writing an auto save failed
+    """
+
+    return _("Backing up document failed")
@@ -17,6 +17,7 @@
 
 
 from abc import abstractmethod, ABC
+from collections import Counter
 from typing import Optional, Tuple, List
 
 from gi.repository import Gtk
@@ -28,9 +29,12 @@ import mpvqc.qc._handlesave as hs
 import mpvqc.qc._statemessages as sm
 from mpvqc import get_settings
 from mpvqc.qc import Comment, _exporter
+from mpvqc.qc._autosave import AutoSaveSnapshot
+from mpvqc.qc._comments import CommentCollection
 from mpvqc.qc._handleimport import HandleImportResultData as Data
+from mpvqc.qc._journal import Journal, JournalContent
 from mpvqc.ui.contentmainmpv import ContentMainMpv as MpvContainer
-from mpvqc.ui.contentmaintable import ContentMainTable as Table
+from mpvqc.ui.contentmaintable import ContentMainTable as Table, TableChanges
 from mpvqc.ui.window import MpvqcWindow as AppWindow
 from mpvqc.utils import StatusbarMessageDuration as Duration
 
@@ -42,21 +46,49 @@ class State(ABC):
             has_changes: bool,
             doc: Optional[str] = None,
             vid: Optional[str] = None,
-            comments: Optional[Tuple[Comment]] = None,
+            comments: Optional[CommentCollection] = None,
             message: Optional[str] = None,
             duration: Optional[Duration] = Duration.LONG
     ):
         self.__has_changes = has_changes
         self.__doc: Optional[str] = doc
         self.__vid: Optional[str] = vid
-        self.__comments: Optional[Tuple[Comment]] = tuple(comments) if comments else ()
+        self.__comments: CommentCollection = comments if comments is not None else CommentCollection()
         self.__message: Optional[str] = message or ""
         self.__duration: Optional[Duration] = duration or Duration.LONG
 
+        # Set on frozen copies only
+        self.__frozen_revision: Optional[int] = None
+        self.__frozen_hash: Optional[int] = None
+        self.__frozen_comments: Optional[Tuple[Comment]] = None
+
     def has_same_content_as(self, other) -> bool:
-        return self.__doc == other.__doc \
-               and self.__vid == other.__vid \
-               and self.__comments == other.__comments
+        """
+        Returns True if the other state has the same document, video and comments as this frozen state
+        """
+
+        if self.__doc != other.__doc or self.__vid != other.__vid:
+            return False
+
+        comments = other.__comments
+        if comments.revision == self.__frozen_revision:
+            return True
+        if comments.content_hash != self.__frozen_hash or len(comments) != len(self.__frozen_comments):
+            return False
+
+        # The table was edited back to what it was or, very unlikely, the hashes collide
+        return Counter(comments) == Counter(self.__frozen_comments)
+
+    def freeze(self) -> 'State':
+        """
+        Returns a copy which keeps the comments as they are now, while all other states follow the table
+        """
+
+        state = self.copy()
+        state.__frozen_revision = self.__comments.revision
+        state.__frozen_hash = self.__comments.content_hash
+        state.__frozen_comments = self.__comments.snapshot()
+        return state
 
     @property
     def duration(self) -> Duration:
@@ -121,7 +153,7 @@ class State(ABC):
     @staticmethod
     def _state_initial(
             vid: Optional[str],
-            comments: Optional[Tuple[Comment]],
+            comments: Optional[CommentCollection],
             message: Optional[str] = "",
             duration: Optional[Duration] = Duration.LONG
     ) -> 'State':
@@ -135,7 +167,7 @@ class State(ABC):
     def _state_saved(
             doc: Optional[str],
             vid: Optional[str],
-            comments: Optional[Tuple[Comment]],
+            comments: Optional[CommentCollection],
             message: Optional[str] = "",
             duration: Optional[Duration] = Duration.LONG
     ) -> 'State':
@@ -149,7 +181,7 @@ class State(ABC):
     def _state_unsaved(
             doc: Optional[str],
             vid: Optional[str],
-            comments: Optional[Tuple[Comment]],
+            comments: Optional[CommentCollection],
             message: Optional[str] = "",
             duration: Optional[Duration] = Duration.LONG
     ) -> 'State':
@@ -159,12 +191,27 @@ class State(ABC):
 
         return _StateUnsaved(doc=doc, vid=vid, comments=comments, message=message, duration=duration)
 
-    def on_comments_modified(self, t: Table) -> 'State':
+    def on_comments_modified(self, changes: TableChanges) -> 'State':
+        """
+        Called when the comments table was modified: added rows, modified rows or deleted rows
+        """
+
+        self.__comments.apply(changes.rows, changes.base_revision, changes.revision)
+        return self._state_unsaved(doc=self.__doc, vid=self.__vid, comments=self.__comments)
+
+    def on_comments_reloaded(self) -> 'State':
         """
-        Called when the comments table was modified: added row, modified row or deleted row
+        Called when the comments table was modified without reporting each row, e.g. if loading was cancelled
         """
 
-        return self._state_unsaved(doc=self.__doc, vid=self.__vid, comments=t.get_all_comments())
+        return self._state_unsaved(doc=self.__doc, vid=self.__vid, comments=self.__comments)
+
+    def on_sync_comments(self, t: Table) -> None:
+        """
+        Updates the comments from the table if rows were changed without applying them one by one
+        """
+
+        self.__comments.sync(t.comment_model)
 
     def on_create_new_document(self, a: AppWindow, t: Table, _: MpvContainer) -> 'State':
         """
@@ -172,7 +219,7 @@ class State(ABC):
         """
 
         if self.__has_changes:
-            if bool(t.get_all_comments()):
+            if t.has_comments():
                 response = md.message_dialog_unsaved_qc_document_clear_comments(parent=a)
                 if response == 0:  # Clear comments
                     pass
@@ -198,14 +245,13 @@ class State(ABC):
         if self.__doc is None:
             return self.on_save_as_pressed(a, t, m)
 
-        comments = t.get_all_comments()
-        r = hs.do_save(self.__doc, self.__vid, comments)
+        r = hs.do_save(self.__doc, self.__vid, t.get_all_comments())
 
         if r.save_error:
             md.message_dialog_document_save_failed(parent=a)
             return self.copy()
 
-        return self._state_saved(doc=r.doc_new, vid=r.vid_new, comments=comments,
+        return self._state_saved(doc=r.doc_new, vid=r.vid_new, comments=self.__comments,
                                  message=sm.get_save_m(as_new_name=False), duration=Duration.SHORT)
 
     def on_save_as_pressed(self, a: AppWindow, t: Table, m: MpvContainer) -> 'State':
@@ -215,8 +261,7 @@ class State(ABC):
 
         m.player.pause()
         doc = d.dialog_save_qc_document(self.__vid, a)
-        comments = t.get_all_comments()
-        r = hs.do_save(doc, self.__vid, comments)
+        r = hs.do_save(doc, self.__vid, t.get_all_comments())
 
         if r.abort:
             return self.copy()
@@ -226,17 +271,41 @@ class State(ABC):
 
         get_settings().latest_paths_recent_files_add(doc)
 
-        return self._state_saved(doc=r.doc_new, vid=r.vid_new, comments=comments,
+        return self._state_saved(doc=r.doc_new, vid=r.vid_new, comments=self.__comments,
                                  message=sm.get_save_m(as_new_name=True))
 
-    def on_write_auto_save(self, _: AppWindow, __: Table, m: MpvContainer) -> None:
+    def on_write_auto_save(self, _: AppWindow, __: Table, m: MpvContainer) -> Optional[AutoSaveSnapshot]:
         """
-        Auto saves the current state
+        Returns a snapshot of the current state to auto save or None if there is nothing to auto save
         """
 
         if m.player.is_video_loaded():
-            content = _exporter.get_file_content(self.__vid, self.__comments or [])
-            _exporter.write_auto_save(video_path=self.__vid, file_content=content)
+            comments = self.__comments.snapshot()
+            content = _exporter.iter_file_content(self.__vid, comments)
+            return AutoSaveSnapshot(video_path=self.__vid, comments=comments, file_content=content)
+        return None
+
+    def on_write_journal(self, j: Journal) -> None:
+        """
+        Replaces the journal by the current content if the journal missed changes of the comments,
+        records the document path, the video path and whether there are unsaved changes only otherwise
+        """
+
+        if j.is_up_to_date():
+            j.record_state(self.__doc, self.__vid, self.__has_changes)
+        else:
+            j.checkpoint(self.__doc, self.__vid, self.__has_changes)
+
+    def on_restore(self, t: Table, content: JournalContent) -> 'State':
+        """
+        Called on startup if the journal of a session which ended without closing the application was found
+        """
+
+        t.clear_all_comments()
+        t.add_comments(content.comments)
+
+        return self._state_unsaved(doc=content.doc, vid=content.vid, comments=self.__comments,
+                                   message=sm.get_restore_m(len(content.comments)))
 
     def on_import(
             self,
@@ -245,11 +314,14 @@ class State(ABC):
             subs: Optional[List[str]],
             a: AppWindow,
             t: Table,
-            m: MpvContainer
+            m: MpvContainer,
+            content: Optional[Tuple[List[str], Tuple[Comment], List[str], List[str]]] = None
     ) -> 'State':
         """
         Called when the user imports something
         (no matter if it's by d&d or just by selecting something in the file manager).
+
+        :param content: the content of the documents if they were read already, see _importer.get_qc_content
         """
 
         if not docs and not vids and not subs:
@@ -270,7 +342,7 @@ class State(ABC):
             Returns True if abort import, False else
             """
 
-            if t.get_all_comments():
+            if t.has_comments():
                 response = md.message_dialog_what_to_do_with_existing_comments()
                 if response == 0:  # Keep comments
                     pass
@@ -298,7 +370,7 @@ class State(ABC):
             m.player.open_video(vid)
             s.latest_paths_recent_files_add(vid)
 
-        hir, data = hi.do_import(self.__vid, docs, vids)
+        hir, data = hi.do_import(self.__vid, docs, vids, max_workers=s.import_max_workers, content=content)
         vid_new = hir.vid_new
 
         if docs:
@@ -430,7 +502,7 @@ class _StateInitial(__StateSubtitleImportDelegate):
             self,
             doc: Optional[str] = None,
             vid: Optional[str] = None,
-            comments: Optional[Tuple[Comment]] = None,
+            comments: Optional[CommentCollection] = None,
             message: Optional[str] = None,
             duration: Optional[Duration] = Duration.LONG
     ):
@@ -438,13 +510,13 @@ class _StateInitial(__StateSubtitleImportDelegate):
 
     def on_import_docs(self, message: str, docs: List[str], data: Data) -> 'State':
         if len(docs) == 1:
-            return self._state_saved(doc=data.doc_new, vid=self._vid, comments=data.comments, message=message)
-        return self._state_unsaved(doc=None, vid=self._vid, comments=data.comments, message=message)
+            return self._state_saved(doc=data.doc_new, vid=self._vid, comments=self._comments, message=message)
+        return self._state_unsaved(doc=None, vid=self._vid, comments=self._comments, message=message)
 
     def on_import_vid(self, message: str, video: str, data: Data) -> 'State':
         if data.is_cur_vid_is_imported_vid:
             return self.copy()
-        return self._state_initial(vid=video, comments=data.comments, message=message)
+        return self._state_initial(vid=video, comments=self._comments, message=message)
 
     def on_import_docs_vid(self, message: str, docs: List[str], video: str, data: Data) -> 'State':
         if len(docs) == 1:
@@ -454,8 +526,8 @@ class _StateInitial(__StateSubtitleImportDelegate):
             vid_linked_in_doc_equals_vid_separately = data.is_vid_from_docs_equals_vid_from_user
 
             if vid_linked_in_doc or vid_linked_in_doc_equals_vid_separately:
-                return self._state_saved(doc=data.doc_new, vid=video, comments=data.comments, message=message)
-        return self._state_unsaved(doc=None, vid=video, comments=data.comments, message=message)
+                return self._state_saved(doc=data.doc_new, vid=video, comments=self._comments, message=message)
+        return self._state_unsaved(doc=None, vid=video, comments=self._comments, message=message)
 
 
 # noinspection DuplicatedCode
@@ -465,22 +537,22 @@ class _StateSaved(__StateSubtitleImportDelegate):
             self,
             doc: Optional[str] = None,
             vid: Optional[str] = None,
-            comments: Optional[Tuple[Comment]] = None,
+            comments: Optional[CommentCollection] = None,
             message: Optional[str] = None,
             duration: Optional[Duration] = Duration.LONG
     ):
         super().__init__(False, doc, vid, comments, message, duration)
 
     def on_import_docs(self, message: str, docs: List[str], data: Data) -> 'State':
-        return self._state_unsaved(doc=None, vid=self._vid, comments=data.comments, message=message)
+        return self._state_unsaved(doc=None, vid=self._vid, comments=self._comments, message=message)
 
     def on_import_vid(self, message: str, video: str, data: Data) -> 'State':
         if data.is_cur_vid_is_imported_vid:
             return self.copy()
-        return self._state_unsaved(doc=None, vid=video, comments=data.comments, message=message)
+        return self._state_unsaved(doc=None, vid=video, comments=self._comments, message=message)
 
     def on_import_docs_vid(self, message: str, docs: List[str], video: str, data: Data) -> 'State':
-        return self._state_unsaved(doc=None, vid=video, comments=data.comments, message=message)
+        return self._state_unsaved(doc=None, vid=video, comments=self._comments, message=message)
 
 
 # noinspection DuplicatedCode
@@ -490,22 +562,22 @@ class _StateUnsaved(__StateSubtitleImportDelegate):
             self,
             doc: Optional[str] = None,
             vid: Optional[str] = None,
-            comments: Optional[Tuple[Comment]] = None,
+            comments: Optional[CommentCollection] = None,
             message: Optional[str] = None,
             duration: Optional[Duration] = Duration.LONG
     ):
         super().__init__(True, doc, vid, comments, message, duration)
 
     def on_import_docs(self, message: str, docs: List[str], data: Data) -> 'State':
-        return self._state_unsaved(doc=None, vid=self._vid, comments=data.comments, message=message)
+        return self._state_unsaved(doc=None, vid=self._vid, comments=self._comments, message=message)
 
     def on_import_vid(self, message: str, video: str, data: Data) -> 'State':
         if data.is_cur_vid_is_imported_vid:
             return self.copy()
-        return self._state_unsaved(doc=None, vid=video, comments=data.comments, message=message)
+        return self._state_unsaved(doc=None, vid=video, comments=self._comments, message=message)
 
     def on_import_docs_vid(self, message: str, docs: List[str], video: str, data: Data) -> 'State':
-        return self._state_unsaved(doc=None, vid=video, comments=data.comments, message=message)
+        return self._state_unsaved(doc=None, vid=video, comments=self._comments, message=message)
 
 
 def get_initial_state() -> State:
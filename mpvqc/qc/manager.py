@@ -16,13 +16,18 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+from concurrent.futures import ThreadPoolExecutor, Future
 from typing import Optional, List
 
 from gi.repository import GObject, GLib
 
 import mpvqc.messagedialogs as md
+import mpvqc.qc._statemessages as sm
 import mpvqc.utils.signals as signals
 from mpvqc import get_settings, dialogs
+from mpvqc.qc import _importer, _journal
+from mpvqc.qc._autosave import AutoSaver
+from mpvqc.utils import StatusbarMessageDuration as Duration
 
 
 class QcManager(GObject.GObject):
@@ -56,23 +61,42 @@ class QcManager(GObject.GObject):
         self.__during_state_change = False
 
         self.__t.connect(signals.MPVQC_TABLE_CONTENT_CHANGED, self.on_table_content_modified)
+        self.__t.connect(signals.MPVQC_TABLE_LOAD_FINISHED, self.on_table_load_finished)
+
+        # Crash recovery: replaying a journal left behind must wait until all widgets are connected
+        self.__journal = _journal.Journal(self.__t.comment_model)
+        GLib.idle_add(self.__restore_from_journal)
+
+        # Documents are read on a worker thread, imports are applied in the order they were requested
+        self.__importer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mpvqc-import")
 
         # Auto save
+        self.__auto_saver = AutoSaver(on_finished=self.__on_auto_save_finished)
         self.__auto_save_timer = None
         self.reset_auto_save()
 
-    def on_table_content_modified(self, *_):
+    def on_table_content_modified(self, _, changes):
         """
-        Called after the table content changed
+        Called after the table content changed, once for all changes within a main loop iteration
         """
 
-        if not self.__during_state_change:
+        if not self.__during_state_change and changes.reported:
             # Filling the table during a state change causes this method (event) being fired
             # So we block it to avoid multiple state change events
             self.__before_stage_change()
-            self.__state = self.__state.on_comments_modified(self.__t)
+            self.__state = self.__state.on_comments_modified(changes)
             self.__after_state_change()
 
+    def on_table_load_finished(self, _, intact: bool):
+        """
+        Called after the table finished adding comments in the background
+        """
+
+        if not intact:
+            # Loading was cancelled or the table was modified meanwhile
+            self.__state = self.__state.on_comments_reloaded()
+        self.__after_state_change()
+
     def request_new_document(self):
         """
         Called when the user presses the 'New' button
@@ -90,9 +114,7 @@ class QcManager(GObject.GObject):
         if paths is None:
             paths = dialogs.dialog_open_qc_files(self.__a)
 
-        self.__before_stage_change()
-        self.__state = self.__state.on_import(docs=paths, vids=None, subs=None, a=self.__a, t=self.__t, m=self.__m)
-        self.__after_state_change()
+        self.__import(docs=paths, vids=None, subs=None)
 
     def request_open_video(self, vid=None):
         """
@@ -103,9 +125,7 @@ class QcManager(GObject.GObject):
             vid = dialogs.dialog_open_video(self.__a)
         vids = [vid] if vid else None
 
-        self.__before_stage_change()
-        self.__state = self.__state.on_import(docs=None, vids=vids, subs=None, a=self.__a, t=self.__t, m=self.__m)
-        self.__after_state_change()
+        self.__import(docs=None, vids=vids, subs=None)
 
     def request_open_subtitles(self):
         """
@@ -114,9 +134,7 @@ class QcManager(GObject.GObject):
 
         subs = dialogs.dialog_open_subtitle_files(self.__a)
 
-        self.__before_stage_change()
-        self.__state = self.__state.on_import(docs=None, vids=None, subs=subs, a=self.__a, t=self.__t, m=self.__m)
-        self.__after_state_change()
+        self.__import(docs=None, vids=None, subs=subs)
 
     def request_save_qc_document(self):
         """
@@ -144,12 +162,14 @@ class QcManager(GObject.GObject):
         """
 
         if not self.__state.has_changes:
+            self.__journal.discard()
             return True
 
         self.__m.player.pause()
 
         response = md.message_dialog_leave_with_unsaved_qc_document()
         if response == 0:  # Still leave
+            self.__journal.discard()
             return True
         return False
 
@@ -163,9 +183,7 @@ class QcManager(GObject.GObject):
         :param subs: a list with paths pointing to subtitles
         """
 
-        self.__before_stage_change()
-        self.__state = self.__state.on_import(docs, vids, subs, self.__a, self.__t, self.__m)
-        self.__after_state_change()
+        self.__import(docs, vids, subs)
 
     def reset_auto_save(self):
         """
@@ -177,7 +195,9 @@ class QcManager(GObject.GObject):
             Function which triggers auto save
             """
 
-            self.__state.on_write_auto_save(self.__a, self.__t, self.__m)
+            snapshot = self.__state.on_write_auto_save(self.__a, self.__t, self.__m)
+            if snapshot is not None:
+                self.__auto_saver.save(snapshot)
             return True
 
         if self.__auto_save_timer is not None:
@@ -187,11 +207,66 @@ class QcManager(GObject.GObject):
         if s.auto_save_enabled and s.auto_save_interval >= 15:
             self.__auto_save_timer = GLib.timeout_add(s.auto_save_interval * 1000, __do_auto_save)
 
+    def __import(self, docs: Optional[List[str]], vids: Optional[List[str]], subs: Optional[List[str]]):
+        """
+        Reads the documents on a worker thread and imports everything on the main loop afterwards.
+        Imports without documents are queued as well, so all imports are applied in the order they were requested.
+        """
+
+        max_workers = get_settings().import_max_workers
+
+        def __read_documents():
+            if docs:
+                return _importer.get_qc_content(docs, max_workers)
+            return None
+
+        future = self.__importer.submit(__read_documents)
+        future.add_done_callback(lambda f: GLib.idle_add(self.__on_documents_read, docs, vids, subs, f))
+
+    def __on_documents_read(self, docs, vids, subs, future: Future) -> bool:
+        """
+        Called on the main loop after the documents of an import were read
+        """
+
+        # Raises errors of reading the documents on the main loop as before
+        content = future.result()
+
+        self.__before_stage_change()
+        self.__state = self.__state.on_import(docs, vids, subs, self.__a, self.__t, self.__m, content=content)
+        self.__after_state_change()
+        return False
+
+    def __restore_from_journal(self) -> bool:
+        """
+        Restores the comments of a session which ended without closing the application
+        """
+
+        content = _journal.read_journal()
+
+        self.__before_stage_change()
+        if content is not None and content.has_changes:
+            self.__state = self.__state.on_restore(self.__t, content)
+        self.__after_state_change()
+        return False
+
+    def __on_auto_save_finished(self, success: bool):
+        """
+        Called on the main loop after an auto save was written. Only failures are shown, as backups are written
+        in the background without the user asking for it. The auto saver counts written and skipped backups.
+        """
+
+        if not success:
+            self.emit(signals.MPVQC_STATUSBAR_UPDATE, sm.get_auto_save_failed_m(), Duration.SHORT.value)
+
     def __before_stage_change(self):
         """
         Requires to be called before any state change originated from a user action except table changes
         """
 
+        # Every state change must see all comments of a previous import and all edits before
+        self.__t.flush_changes()
+        self.__t.finish_loading()
+        self.__journal.pause()
         self.__during_state_change = True
 
     def __after_state_change(self):
@@ -199,8 +274,18 @@ class QcManager(GObject.GObject):
         Called after the state has changed
         """
 
+        # Changes caused by the state change itself are not reported
+        self.__t.flush_changes()
+
+        if self.__t.is_loading:
+            # Signals are emitted and the journal is written as soon as the table finished loading
+            return
+
+        # Rows added or removed during a state change are not applied one by one
+        self.__state.on_sync_comments(self.__t)
+
         if not self.__state.has_changes:
-            self.__state_last_saved = self.__state.copy()
+            self.__state_last_saved = self.__state.freeze()
         else:
             matches_last_save = self.__state_last_saved is not None \
                                 and self.__state_last_saved.has_same_content_as(self.__state)
@@ -210,6 +295,9 @@ class QcManager(GObject.GObject):
 
         s = self.__state
 
+        # The whole table is written to the journal only if the comments changed while the journal was paused
+        s.on_write_journal(self.__journal)
+
         if s.message:
             self.emit(signals.MPVQC_STATUSBAR_UPDATE, s.message, s.duration.value)
 
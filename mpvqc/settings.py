@@ -219,11 +219,14 @@ class Settings:
 
         self.__auto_save_enabled = _Bool("auto-backup-enabled", s)
         self.__auto_save_interval = _Int("auto-backup-interval", s)
+        self.__auto_save_max_age = _Int("auto-backup-max-age", s)
+        self.__auto_save_max_count = _Int("auto-backup-max-count", s)
 
         self.__status_bar_time_format = _Int("status-bar-time-format", s)
         self.__status_bar_percentage = _Bool("status-bar-percentage", s)
 
         self.__import_open_video_automatically = _Bool("import-open-video-automatically", s)
+        self.__import_max_workers = _Int("import-max-workers", s)
 
         self.__export_qc_document_nick = _Nickname("export-qc-document-nick", s)
         self.__export_append_nick = _Bool("export-append-nick", s)
@@ -314,6 +317,28 @@ class Settings:
     def bind_auto_save_interval(self, obj, prop, flags=Gio.SettingsBindFlags.DEFAULT) -> None:
         self.__auto_save_interval.bind(obj, prop, flags)
 
+    #
+    # Auto save max age
+    #
+
+    @property
+    def auto_save_max_age(self) -> int:
+        return self.__auto_save_max_age.get()
+
+    def reset_auto_save_max_age(self) -> None:
+        self.__auto_save_max_age.reset()
+
+    #
+    # Auto save max count
+    #
+
+    @property
+    def auto_save_max_count(self) -> int:
+        return self.__auto_save_max_count.get()
+
+    def reset_auto_save_max_count(self) -> None:
+        self.__auto_save_max_count.reset()
+
     #
     # Status bar time format
     #
@@ -352,6 +377,17 @@ class Settings:
     def bind_import_open_video_automatically(self, obj, prop, flags=Gio.SettingsBindFlags.DEFAULT) -> None:
         self.__import_open_video_automatically.bind(obj, prop, flags)
 
+    #
+    # Import: max workers
+    #
+
+    @property
+    def import_max_workers(self) -> int:
+        return self.__import_max_workers.get()
+
+    def reset_import_max_workers(self) -> None:
+        self.__import_max_workers.reset()
+
     #
     # Export: qc document nickname
     #
@@ -0,0 +1,137 @@
+# mpvQC
+#
+# Copyright (C) 2020 mpvQC developers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+import sqlite3
+from gettext import gettext as _
+from threading import Thread
+from typing import List
+
+from gi.repository import Gtk, GLib
+
+from mpvqc import dialogs, template
+from mpvqc.qc._backupindex import BackupIndex, BackupEntry
+from mpvqc.qc._exporter import write_qc_document
+
+# The number of backups listed at most, the latest first
+_MAX_ENTRIES = 1000
+
+
+@template.TemplateTrans(resource_path='/data/ui/backupbrowser.ui')
+class BackupBrowser(Gtk.Dialog):
+    """
+    Lists all auto saves, filterable by video name, and restores them as qc documents.
+    """
+
+    __gtype_name__ = 'BackupBrowser'
+
+    button_restore: Gtk.Button = template.TemplateTrans.Child()
+    search_entry: Gtk.SearchEntry = template.TemplateTrans.Child()
+    tree_view: Gtk.TreeView = template.TemplateTrans.Child()
+    label_status: Gtk.Label = template.TemplateTrans.Child()
+    model: Gtk.ListStore = template.TemplateTrans.Child()
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.init_template()
+
+        self.__index = None
+        self.__entries: List[BackupEntry] = []
+        self.__destroyed = False
+
+        # Indexing new backups may read many archives, the index is queried on the main loop afterwards
+        Thread(target=self.__update_index, name="mpvqc-backup-index", daemon=True).start()
+
+    @template.TemplateTrans.Callback()
+    def on_search_changed(self, *__) -> None:
+        if self.__index is not None:
+            self.__query()
+
+    @template.TemplateTrans.Callback()
+    def on_selection_changed(self, selection: Gtk.TreeSelection) -> None:
+        self.button_restore.set_sensitive(selection.get_selected()[1] is not None)
+
+    @template.TemplateTrans.Callback()
+    def on_row_activated(self, *__) -> None:
+        self.response(Gtk.ResponseType.ACCEPT)
+
+    @template.TemplateTrans.Callback()
+    def on_response(self, __, response: int) -> None:
+        if response != Gtk.ResponseType.ACCEPT:
+            self.destroy()
+            return
+
+        model, iterator = self.tree_view.get_selection().get_selected()
+        if iterator is None:
+            return
+
+        entry = self.__entries[model.get_path(iterator).get_indices()[0]]
+        file_path = dialogs.dialog_save_qc_document(None, self)
+        if not file_path:
+            return
+
+        try:
+            write_qc_document(file_path, (self.__index.read_entry(entry),))
+            self.label_status.set_text(_("Restored backup to {}").format(file_path))
+        except (OSError, ValueError):
+            self.label_status.set_text(_("Restoring backup failed"))
+
+    @template.TemplateTrans.Callback()
+    def on_destroy(self, *__) -> None:
+        self.__destroyed = True
+        if self.__index is not None:
+            self.__index.close()
+            self.__index = None
+
+    def __update_index(self) -> None:
+        try:
+            index = BackupIndex()
+            try:
+                index.update()
+            finally:
+                index.close()
+        except (OSError, sqlite3.Error):
+            # Backups indexed so far can still be browsed
+            pass
+        GLib.idle_add(self.__on_index_updated)
+
+    def __on_index_updated(self) -> bool:
+        if self.__destroyed:
+            return False
+
+        try:
+            self.__index = BackupIndex()
+        except (OSError, sqlite3.Error):
+            self.label_status.set_text(_("Backups could not be listed"))
+            return False
+
+        self.search_entry.set_sensitive(True)
+        self.search_entry.grab_focus()
+        self.__query()
+        return False
+
+    def __query(self) -> None:
+        try:
+            self.__entries = self.__index.find(video_name=self.search_entry.get_text(), limit=_MAX_ENTRIES)
+        except sqlite3.Error:
+            self.__entries = []
+
+        self.model.clear()
+        for entry in self.__entries:
+            self.model.append([entry.time.strftime("%x %X"), entry.video_name, str(entry.comments)])
+
+        self.label_status.set_text(_("{} backups").format(len(self.__entries)))
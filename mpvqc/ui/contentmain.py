@@ -92,13 +92,13 @@ class ContentMain(Gtk.Box):
         self.__table_widget.connect("key-press-event", self.__video_widget.on_key_press_event)
         # Connect events: Statusbar
         self.__table_widget.get_selection().connect("changed", self.__status_bar.on_comments_selection_change)
-        self.__table_widget.get_model().connect("row-changed", self.__status_bar.on_comments_row_changed)
-        self.__table_widget.get_model().connect("row-deleted", self.__status_bar.on_comments_row_changed)
-        self.__table_widget.get_model().connect("row-inserted", self.__status_bar.on_comments_row_changed)
+        self.__table_widget.connect(signals.MPVQC_TABLE_CONTENT_CHANGED, self.__status_bar.on_comments_changed)
+        self.__table_widget.connect(signals.MPVQC_TABLE_LOAD_PROGRESS, self.__status_bar.on_comments_load_progress)
         # Connect events: QC-Manager
         self.__qc_manager.connect(signals.MPVQC_STATUSBAR_UPDATE, self.__status_bar.update_statusbar_message)
         self.__qc_manager.connect(signals.MPVQC_QC_STATE_CHANGED, self.__update_title)
-        self.__qc_manager.connect(signals.MPVQC_QC_STATE_CHANGED, self.__search_frame.clear_current_matches)
+        # Connect events: Search
+        self.__table_widget.connect(signals.MPVQC_TABLE_CONTENT_CHANGED, self.__search_frame.on_comments_changed)
 
         # Class variables
         self.__is_fullscreen = False
@@ -17,7 +17,8 @@
 
 
 import re
-from typing import Tuple
+from functools import lru_cache
+from typing import Tuple, Optional, Dict, NamedTuple, Callable
 
 from gi.repository import Gtk, Gdk, GObject, GLib
 
@@ -25,15 +26,139 @@ import mpvqc.utils.signals as signals
 from mpvqc import template
 from mpvqc.cellrenderer import CellRendererSeek, CellRendererTime, CellRendererType, CellRendererComment
 from mpvqc.qc import Comment
+from mpvqc.ui.contentmaintablemodel import ContentMainTableModel, COLUMN_TIME, COLUMN_TYPE, COLUMN_ROW_ID
 from mpvqc.ui.popovertimeedit import PopoverTimeEdit
 from mpvqc.ui.popovertypeedit import PopoverTypeEdit
-from mpvqc.utils import keyboard, get_markup
+from mpvqc.utils import keyboard, get_markup, QueryMode
 from mpvqc.utils.input import MouseButton
 
-PLAY_ICON = "media-playback-start-symbolic"
+# Comments are added in chunks of this size from the main loop. Smaller lists are added immediately
+_LOAD_CHUNK_SIZE = 10000
+
+# Reported instead of a row id if rows changed without being reported one by one
+_MANY_ROWS = -1
+
+# Changes are handed over before the table is redrawn
+_CHANGES_PRIORITY = GLib.PRIORITY_HIGH_IDLE
 
 _REGEX_URLS = re.compile(r"((https?://|www\.).*?\..*?[^\s]+)")
 
+# Markups of recently drawn comments, by far more than rows fit on a screen
+_MARKUP_CACHE_SIZE = 4096
+
+
+class TableChanges(NamedTuple):
+    """All changes of the table within one main loop iteration"""
+
+    # The new comment of each inserted or changed row by row id, None if the row was deleted
+    rows: Dict[int, Optional[Comment]]
+
+    # The model revision before the first change or -1 if rows does not hold all changes
+    base_revision: int
+
+    # The model revision after the last change
+    revision: int
+
+    # The number of changes reported one by one, e.g. by editing a comment
+    reported: int
+
+    # The number of changes while the table was filled, e.g. by an import
+    silent: int
+
+    # The index of the row changed last
+    last_index: int
+
+
+class _ChangeScheduler:
+    """
+    Collects the changes of the table model and hands them over at once, as soon as the main loop is idle.
+    """
+
+    def __init__(self, model: ContentMainTableModel, on_changes: Callable[[TableChanges], None]):
+        """
+        :param model: the model of the table
+        :param on_changes: called with all changes collected since the last call
+        """
+
+        self.__model = model
+        self.__on_changes = on_changes
+        self.__source = None
+
+        self.__rows: Dict[int, Optional[Comment]] = {}
+        self.__base_revision = _MANY_ROWS
+        self.__revision = 0
+        self.__reported = 0
+        self.__silent = 0
+        self.__last_index = 0
+
+        self.__event_count = 0
+        self.__notification_count = 0
+
+    @property
+    def event_count(self) -> int:
+        """Returns the amount of changes collected so far"""
+
+        return self.__event_count
+
+    @property
+    def notification_count(self) -> int:
+        """Returns the amount of times changes were handed over so far"""
+
+        return self.__notification_count
+
+    def add(self, index: int, row_id: int = _MANY_ROWS, comment: Optional[Comment] = None, reported=True) -> None:
+        """
+        Adds a change of the model.
+
+        :param index: the index of the changed row
+        :param row_id: the row id of the changed row or -1 if many rows changed
+        :param comment: the new comment of the row or None if the row was deleted
+        :param reported: True if the change is reported one by one, False if the table is being filled
+        """
+
+        revision = self.__model.revision
+
+        if self.__source is None:
+            self.__base_revision = self.__revision = revision - 1
+            self.__source = GLib.idle_add(self.__on_idle, priority=_CHANGES_PRIORITY)
+
+        # Each change increments the revision by one, all others were not seen
+        if not reported or row_id == _MANY_ROWS or revision != self.__revision + 1:
+            self.__base_revision = _MANY_ROWS
+
+        if reported:
+            self.__reported += 1
+            if row_id != _MANY_ROWS:
+                self.__rows[row_id] = comment
+        else:
+            self.__silent += 1
+
+        self.__revision = revision
+        self.__last_index = index
+        self.__event_count += 1
+
+    def flush(self) -> None:
+        """
+        Immediately hands over all collected changes, if any.
+        """
+
+        if self.__source is not None:
+            GLib.source_remove(self.__source)
+            self.__on_idle()
+
+    def __on_idle(self) -> bool:
+        changes = TableChanges(self.__rows, self.__base_revision, self.__revision,
+                               self.__reported, self.__silent, self.__last_index)
+
+        self.__source = None
+        self.__rows = {}
+        self.__reported = 0
+        self.__silent = 0
+        self.__notification_count += 1
+
+        self.__on_changes(changes)
+        return False
+
 
 def get_comment_markup_mode_default(raw_comment) -> str:
     """
@@ -46,16 +171,34 @@ def get_comment_markup_mode_default(raw_comment) -> str:
     return _REGEX_URLS.sub(r"{}\1{}".format("<i>", "</i>"), raw_comment)
 
 
-def get_comment_markup_mode_search(raw_comment, query) -> str:
+def get_comment_markup_mode_search(raw_comment, query, mode=QueryMode.TEXT) -> str:
     """
     Returns the markup for a comment **if search mode is active**.
 
     :param raw_comment: a string (no markup highlight applied yet) - the comment
     :param query: the string to highlight
+    :param mode: how the query is matched
+    :return: a markup string
+    """
+
+    return get_markup(raw_comment, query, "<span weight='heavy'>", "</span>", mode)[0]
+
+
+@lru_cache(maxsize=_MARKUP_CACHE_SIZE)
+def get_comment_markup(raw_comment: str, query: Optional[str], mode=QueryMode.TEXT) -> str:
+    """
+    Returns the markup for a comment, cached for the recently drawn comments.
+    As comments are immutable strings, a changed row never hits the markup of its previous comment.
+
+    :param raw_comment: a string (no markup highlight applied yet) - the comment
+    :param query: the string to highlight if search mode is active, None else
+    :param mode: how the query is matched
     :return: a markup string
     """
 
-    return get_markup(raw_comment, query, "<span weight='heavy'>", "</span>")[0]
+    if query:
+        return get_comment_markup_mode_search(raw_comment, query, mode)
+    return get_comment_markup_mode_default(raw_comment)
 
 
 @template.TemplateTrans(resource_path='/data/ui/contentmaintable.ui')
@@ -63,7 +206,12 @@ class ContentMainTable(Gtk.TreeView):
     __gtype_name__ = 'ContentMainTable'
 
     __gsignals__ = {
-        signals.MPVQC_TABLE_CONTENT_CHANGED: (GObject.SignalFlags.RUN_FIRST, None, (bool,)),
+        # Signals, once per main loop iteration in which rows changed: p1 'TableChanges'
+        signals.MPVQC_TABLE_CONTENT_CHANGED: (GObject.SignalFlags.RUN_FIRST, None, (object,)),
+        # Signals, when loading comments finished: p1 'True if all comments were added and no other change happened'
+        signals.MPVQC_TABLE_LOAD_FINISHED: (GObject.SignalFlags.RUN_FIRST, None, (bool,)),
+        # Signals, while loading comments: p1 'comments added' ; p2 'comments to add'
+        signals.MPVQC_TABLE_LOAD_PROGRESS: (GObject.SignalFlags.RUN_FIRST, None, (int, int)),
     }
 
     def __init__(self, video_widget, **kwargs):
@@ -71,9 +219,8 @@ class ContentMainTable(Gtk.TreeView):
         self.__video_widget = video_widget
         self.init_template()
 
-        # Model
-        self.__model = Gtk.ListStore(str, str, str, str)
-        self.__model.set_sort_column_id(1, Gtk.SortType.ASCENDING)
+        # Model: icon, time, type, note, row id - always sorted by time
+        self.__model = ContentMainTableModel()
         self.set_enable_search(False)
         self.set_model(self.__model)
 
@@ -101,10 +248,18 @@ class ContentMainTable(Gtk.TreeView):
         self.get_selection().connect("changed", self.__on_selection_changed)
         self.__video_widget.connect(signals.MPVQC_CREATE_NEW_COMMENT, self.__add_comment_from_context_menu)
 
-        self.__model.connect("row-changed", self.__fire_signal_not_up_to_date)
-        self.__model.connect("row-deleted", self.__fire_signal_not_up_to_date)
-        self.__model.connect("row-inserted", self.__fire_signal_not_up_to_date)
+        # Rows are only deleted by the table itself, which reports them as the row id is gone afterwards
+        self.__model.connect("row-changed", self.__on_row_changed)
+        self.__model.connect("row-inserted", self.__on_row_changed)
+        self.__model.connect("row-deleted", self.__on_row_deleted)
         self.__fire_signal_blocked = False
+        self.__changes = _ChangeScheduler(self.__model, self.__on_changes)
+
+        # Progressive loading
+        self.__load_source = None
+        self.__load_comments = ()
+        self.__load_position = 0
+        self.__load_intact = True
 
         # Class variables
         self.__scrollbar_position = None
@@ -138,7 +293,10 @@ class ContentMainTable(Gtk.TreeView):
         no_mod, ctrl, alt, shift = keyboard.extract_modifiers(event.state)
         key = event.keyval
 
-        if key == Gdk.KEY_Delete:
+        if key == Gdk.KEY_Escape and self.is_loading:
+            self.cancel_loading()
+            return True
+        elif key == Gdk.KEY_Delete:
             self.__do_with_selected(self.__do_selected_delete_row)
             return True
         elif key == Gdk.KEY_Return or key == Gdk.KEY_BackSpace:
@@ -152,24 +310,67 @@ class ContentMainTable(Gtk.TreeView):
             return True
         return False
 
+    @property
+    def comment_model(self) -> ContentMainTableModel:
+        """Returns the model of the table, even while it is detached from the table to add many comments"""
+
+        return self.__model
+
+    @property
+    def is_loading(self) -> bool:
+        """Returns True while comments are added in the background, False else"""
+
+        return self.__load_source is not None
+
     def add_comments(self, comments: Tuple[Comment]) -> None:
         """
         Adds a list of comments to the table and scrolls to the last added comment.
+        Large lists are added in chunks from the main loop. Progress is reported by the 'load-progress' signal,
+        the 'load-finished' signal is emitted as soon as all comments were added.
+        The model is detached from the table while comments are added, so the table does not handle each new row.
+        Between chunks the model is attached, so the comments added so far are shown and can be edited.
 
         :param comments: list of comments to add
         """
 
         if comments:
-            comments = list(comments)
-            last = comments.pop(-1)
+            self.finish_loading()
 
-            self.__fire_signal_blocked = True
-            for comment in comments:
-                self.__model.append([PLAY_ICON, comment.comment_time, comment.comment_type, comment.comment_note])
-            self.__fire_signal_blocked = False
+            if len(comments) <= _LOAD_CHUNK_SIZE:
+                comments = list(comments)
+                last = comments.pop(-1)
 
-            self.__add_comment(last.comment_time, last.comment_type, last.comment_note, start_editing=False)
-            self.__renderer_type.recalculate_preferred_width()
+                self.__detach_model()
+                self.__append_comments(comments)
+                self.__attach_model()
+                self.__add_comment(last.comment_time, last.comment_type, last.comment_note, start_editing=False)
+                self.__renderer_type.recalculate_preferred_width()
+            else:
+                self.__load_comments = tuple(comments)
+                self.__load_position = 0
+                self.__load_intact = True
+                self.__load_source = GLib.idle_add(self.__on_load_chunk)
+
+    def finish_loading(self) -> None:
+        """
+        Immediately adds all comments which are still waiting to be added in the background.
+        """
+
+        if self.__load_source is not None:
+            GLib.source_remove(self.__load_source)
+            self.__load_source = None
+            self.__append_chunk(self.__load_comments[self.__load_position:-1])
+            self.__complete_loading(cancelled=False)
+
+    def cancel_loading(self) -> None:
+        """
+        Stops adding comments in the background. Comments added so far remain in the table.
+        """
+
+        if self.__load_source is not None:
+            GLib.source_remove(self.__load_source)
+            self.__load_source = None
+            self.__complete_loading(cancelled=True)
 
     def get_all_comments(self) -> Tuple[Comment]:
         """
@@ -178,39 +379,64 @@ class ContentMainTable(Gtk.TreeView):
         :return: all items of the given model
         """
 
-        items = []
-        iterator = self.__model.get_iter_first()
-        while iterator:
-            c_time = self.__model.get_value(iterator, 1)
-            c_type = self.__model.get_value(iterator, 2)
-            c_comm = self.__model.get_value(iterator, 3)
-            items.append(Comment(c_time, c_type, c_comm))
-            iterator = self.__model.iter_next(iterator)
-        return tuple(items)
+        return self.__model.get_all_comments()
+
+    @property
+    def change_event_count(self) -> int:
+        """Returns the amount of row changes so far"""
+
+        return self.__changes.event_count
+
+    @property
+    def change_notification_count(self) -> int:
+        """Returns the amount of content changed signals so far, each covering all row changes in between"""
+
+        return self.__changes.notification_count
+
+    def flush_changes(self) -> None:
+        """
+        Immediately emits the content changed signal for all row changes which are still waiting to be reported.
+        """
+
+        self.__changes.flush()
+
+    def has_comments(self) -> bool:
+        """
+        Returns True if the table holds at least one comment, False else.
+        """
+
+        return len(self.__model) > 0
 
     def clear_all_comments(self) -> None:
         """
         Deletes all comments from the table.
         """
 
-        self.__fire_signal_blocked = True
+        self.cancel_loading()
+
+        # Clearing does not signal the rows one by one, the table reads the empty model once attached again
+        self.__detach_model()
         self.__model.clear()
-        self.__fire_signal_blocked = False
-        self.__fire_signal_not_up_to_date()
+        self.__attach_model()
+        self.__fire_signal_not_up_to_date(0, _MANY_ROWS, None)
 
     def highlight_row(self, tree_path) -> None:
         """
         Select row of tree_path.
         """
 
+        if self.get_model() is None:
+            return
+
         self.set_cursor_on_cell(tree_path, self.__column_comment, self.__renderer_comment, start_editing=False)
         self.row_activated(tree_path, column=self.__column_comment)
 
     def set_comment_cell_data_func(self, func) -> None:
         """
-        Specify the cell data func to use for the comments.
+        Specify the cell data func to use for the comments. It replaces the markup attribute of the column.
         """
 
+        self.__column_comment.clear_attributes(self.__renderer_comment)
         self.__column_comment.set_cell_data_func(self.__renderer_comment, func)
 
     def before_hide(self) -> None:
@@ -224,6 +450,94 @@ class ContentMainTable(Gtk.TreeView):
 
         GLib.timeout_add(90, __set_scrollbar_position)
 
+    def __detach_model(self) -> None:
+        """
+        Detaches the model from the table to add many comments at once.
+        """
+
+        if self.get_model() is not None:
+            self.set_model(None)
+
+    def __attach_model(self) -> None:
+        """
+        Attaches the model to the table again. The table reads all rows at once.
+        """
+
+        if self.get_model() is None:
+            self.set_model(self.__model)
+
+    def __append_comments(self, comments) -> None:
+        """
+        Adds the comments to the detached model in one pass without firing a signal for each of them.
+
+        :param comments: the comments to add
+        """
+
+        if comments:
+            self.__model.load_comments(comments)
+            self.__changes.add(len(self.__model) - 1, reported=False)
+
+    def __append_chunk(self, comments) -> None:
+        """
+        Adds a chunk of comments while loading in the background. The model is only detached while adding,
+        the scroll position is kept.
+
+        :param comments: the comments to add
+        """
+
+        adjustment = self.get_vadjustment()
+        position = adjustment.get_value()
+
+        self.__detach_model()
+        self.__append_comments(comments)
+        self.__attach_model()
+
+        adjustment.set_value(position)
+
+    def __on_load_chunk(self) -> bool:
+        """
+        Adds the next chunk of comments while loading in the background.
+
+        :return: True if there are more chunks to add, False else
+        """
+
+        comments = self.__load_comments
+        start = self.__load_position
+        end = min(start + _LOAD_CHUNK_SIZE, len(comments) - 1)
+
+        self.__append_chunk(comments[start:end])
+        self.__load_position = end
+
+        if end < len(comments) - 1:
+            self.emit(signals.MPVQC_TABLE_LOAD_PROGRESS, end, len(comments))
+            return True
+
+        self.__load_source = None
+        self.__complete_loading(cancelled=False)
+        return False
+
+    def __complete_loading(self, cancelled: bool) -> None:
+        """
+        Adds the last comment (unless cancelled) and signals that loading finished.
+
+        :param cancelled: True if loading was cancelled, False else
+        """
+
+        last = self.__load_comments[-1]
+        intact = self.__load_intact and not cancelled
+
+        self.__load_comments = ()
+        self.__load_position = 0
+        self.__attach_model()
+
+        if not cancelled:
+            self.__fire_signal_blocked = True
+            self.__add_comment(last.comment_time, last.comment_type, last.comment_note, start_editing=False)
+            self.__fire_signal_blocked = False
+        self.__renderer_type.recalculate_preferred_width()
+
+        self.emit(signals.MPVQC_TABLE_LOAD_FINISHED, intact)
+
     def __add_comment(self, c_time, c_type, c_comm="", start_editing=True):
         """
         Adds a comment to the table. Then scrolls to the newly added comment and starts edit mode if set to True.
@@ -234,8 +548,8 @@ class ContentMainTable(Gtk.TreeView):
         :param c_comm: Comment text the text of the comment to be added
         """
 
-        c_comm = self.__model.append([PLAY_ICON, c_time, c_type, c_comm])
-        path = self.__model.get_path(c_comm)
+        iterator = self.__model.add_comment(c_time, c_type, c_comm)
+        path = self.__model.get_path(iterator)
         self.set_cursor_on_cell(path, self.__column_comment, self.__renderer_comment, start_editing)
 
     def __add_comment_from_context_menu(self, _, time, comment_type):
@@ -266,11 +580,15 @@ class ContentMainTable(Gtk.TreeView):
         :param path_iter: the path iter object to get and set the value
         """
 
+        # The row may move while the popover is open, e.g. if comments are loaded in the background
+        row = Gtk.TreeRowReference.new(self.__model, path)
+
         def __set_value(__, v):
-            self.__model.set_value(path_iter, 1, v)
-            self.__on_selection_changed()
+            if row.valid():
+                self.__model.set_value(self.__model.get_iter(row.get_path()), COLUMN_TIME, v)
+                self.__on_selection_changed()
 
-        pop = PopoverTimeEdit(self, self.__video_widget, self.__model.get_value(path_iter, 1))
+        pop = PopoverTimeEdit(self, self.__video_widget, self.__model.get_value(path_iter, COLUMN_TIME))
         pop.connect(signals.MPVQC_APPLY, __set_value)
         pop.set_pointing_to(self.get_cell_area(path, col))
         pop.set_relative_to(self)
@@ -285,11 +603,14 @@ class ContentMainTable(Gtk.TreeView):
         :param path_iter: the path iter object to get and set the value
         """
 
+        row = Gtk.TreeRowReference.new(self.__model, path)
+
         def __set_value(__, v):
-            self.__model.set_value(path_iter, 2, v)
-            self.__on_selection_changed()
+            if row.valid():
+                self.__model.set_value(self.__model.get_iter(row.get_path()), COLUMN_TYPE, v)
+                self.__on_selection_changed()
 
-        pop = PopoverTypeEdit(self.__model.get_value(path_iter, 2))
+        pop = PopoverTypeEdit(self.__model.get_value(path_iter, COLUMN_TYPE))
         pop.connect(signals.MPVQC_APPLY, __set_value)
         pop.set_pointing_to(self.get_cell_area(path, col))
         pop.set_relative_to(self)
@@ -343,7 +664,10 @@ class ContentMainTable(Gtk.TreeView):
         :param path: the cell to delete
         """
 
-        self.__model.remove(self.__model.get_iter(path))
+        iterator = self.__model.get_iter(path)
+        row_id = self.__model.get_value(iterator, COLUMN_ROW_ID)
+        self.__model.remove(iterator)
+        self.__fire_signal_not_up_to_date(path.get_indices()[0], row_id, None)
 
     def __do_selected_start_edit(self, path):
         """
@@ -366,10 +690,43 @@ class ContentMainTable(Gtk.TreeView):
         text = str(Comment(comment_time=row[1], comment_type=row[2], comment_note=row[3]))
         Gtk.Clipboard.get(Gdk.SELECTION_CLIPBOARD).set_text(text, -1)
 
-    def __fire_signal_not_up_to_date(self, *_):
+    def __on_row_changed(self, model: ContentMainTableModel, path: Gtk.TreePath, _: Gtk.TreeIter) -> None:
         """
-        Fires a signal that the table has changed
+        Called after a row was inserted or changed
+        """
+
+        index = path.get_indices()[0]
+
+        if self.__fire_signal_blocked:
+            self.__changes.add(index, reported=False)
+        else:
+            self.__fire_signal_not_up_to_date(index, *model.get_comment(index))
+
+    def __on_row_deleted(self, _: ContentMainTableModel, path: Gtk.TreePath) -> None:
+        """
+        Called after a row was deleted
+        """
+
+        if self.__fire_signal_blocked:
+            self.__changes.add(path.get_indices()[0], reported=False)
+
+    def __fire_signal_not_up_to_date(self, index: int, row_id: int, comment: Optional[Comment]) -> None:
+        """
+        Schedules a signal that the table has changed. All changes until the main loop is idle are signaled at once.
+
+        :param index: the index of the changed row
+        :param row_id: the row id of the changed row or -1 if many rows changed
+        :param comment: the new comment of the row or None if the row was deleted
         """
 
         if not self.__fire_signal_blocked:
-            self.emit(signals.MPVQC_TABLE_CONTENT_CHANGED, False)
+            if self.is_loading:
+                self.__load_intact = False
+            self.__changes.add(index, row_id, comment)
+
+    def __on_changes(self, changes: TableChanges) -> None:
+        """
+        Fires a signal that the table has changed
+        """
+
+        self.emit(signals.MPVQC_TABLE_CONTENT_CHANGED, changes)
@@ -0,0 +1,431 @@
+# mpvQC
+#
+# Copyright (C) 2020 mpvQC developers
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+
+from array import array
+from bisect import bisect_right
+from itertools import islice, compress, count
+from operator import le
+from typing import Tuple, List, Iterable, Iterator, Dict, Optional, Sequence, Container
+
+from gi.repository import GObject, Gtk
+
+import mpvqc.utils.signals as signals
+from mpvqc.qc import Comment, to_milliseconds
+
+PLAY_ICON = "media-playback-start-symbolic"
+
+# Columns
+COLUMN_ICON = 0
+COLUMN_TIME = 1
+COLUMN_TYPE = 2
+COLUMN_NOTE = 3
+COLUMN_ROW_ID = 4
+COLUMN_TIME_KEY = 5
+
+_COLUMN_TYPES = (
+    GObject.TYPE_STRING,
+    GObject.TYPE_STRING,
+    GObject.TYPE_STRING,
+    GObject.TYPE_STRING,
+    GObject.TYPE_INT,
+    GObject.TYPE_INT64,
+)
+
+# Iters store the row index plus one, as a row index of zero would be a NULL pointer
+_ITER_OFFSET = 1
+
+# Identifies iters created by this model
+_ITER_STAMP = 0x6d707663
+
+# Display strings of all times seen so far
+_TIME_STRINGS: Dict[int, str] = {}
+
+
+def _to_time_string(milliseconds: int) -> str:
+    time_string = _TIME_STRINGS.get(milliseconds)
+    if time_string is None:
+        seconds, fraction = divmod(milliseconds, 1000)
+        time_string = "{:02d}:{:02d}:{:02d}".format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+        if fraction:
+            time_string += ".{:03d}".format(fraction)
+        _TIME_STRINGS[milliseconds] = time_string
+    return time_string
+
+
+class ContentMainTableModel(GObject.Object, Gtk.TreeModel):
+    """
+    A list model holding all comments sorted by time. Comments with equal time keep their insertion order.
+
+    Columns are stored in plain arrays: the time in milliseconds, an id per distinct comment type, the note and a
+    unique row id. The icon and the time string are computed when a cell is read.
+    Rows are sorted by the time in milliseconds, which is also available as hidden column. Times of new rows
+    are located by binary search.
+    Python code should use the column accessors instead of iterating over the model as each
+    access through the Gtk.TreeModel interface crosses the GObject boundary.
+    Each inserted, changed or deleted row increments the revision of the model.
+    As the new order of 'rows-reordered' can not be read from Python, moving a row is signaled by its indices too.
+    """
+
+    __gtype_name__ = "ContentMainTableModel"
+
+    __gsignals__ = {
+        # Signals, right after 'rows-reordered' if a row moved: p1 'previous index' ; p2 'new index'
+        signals.MPVQC_TABLE_ROW_MOVED: (GObject.SignalFlags.RUN_FIRST, None, (int, int)),
+    }
+
+    def __init__(self):
+        super().__init__()
+
+        self.__times = array("q")
+        self.__types = array("q")
+        self.__notes: List[str] = []
+        self.__row_ids = array("q")
+
+        self.__type_names: List[str] = []
+        self.__type_ids: Dict[str, int] = {}
+
+        self.__next_row_id = 0
+        self.__revision = 0
+
+    def __len__(self) -> int:
+        return len(self.__times)
+
+    @property
+    def revision(self) -> int:
+        """Returns the number of row changes since the model was created"""
+
+        return self.__revision
+
+    def add_comment(self, comment_time: str, comment_type: str, comment_note: str) -> Gtk.TreeIter:
+        """
+        Inserts a comment behind all comments with the same or an earlier time.
+
+        :return: the iter of the new row
+        """
+
+        return self.__insert(Comment(comment_time, comment_type, comment_note))
+
+    def add_comments(self, comments: Iterable[Comment]) -> None:
+        """
+        Inserts all comments, each behind all comments with the same or an earlier time.
+        """
+
+        for comment in comments:
+            self.__insert(comment)
+
+    def load_comments(self, comments: Sequence[Comment]) -> None:
+        """
+        Inserts many comments at once, each behind all comments with the same or an earlier time.
+
+        Rows are not signaled one by one, so the model must be detached from all views while loading. Iters and row
+        references created before are invalid afterwards. Comments sorted by time which do not start before the
+        last row are appended, all other comments are merged in a single stable sort.
+        """
+
+        if not comments:
+            return
+
+        times = [comment.comment_milliseconds for comment in comments]
+        types = [self.__get_type_id(comment.comment_type) for comment in comments]
+        notes = [comment.comment_note for comment in comments]
+        row_ids = range(self.__next_row_id, self.__next_row_id + len(comments))
+
+        self.__next_row_id += len(comments)
+        self.__revision += len(comments)
+
+        in_order = all(map(le, times, islice(times, 1, None)))
+        if in_order and (not self.__times or self.__times[-1] <= times[0]):
+            self.__times.extend(times)
+            self.__types.extend(types)
+            self.__notes.extend(notes)
+            self.__row_ids.extend(row_ids)
+            return
+
+        all_times = self.__times.tolist() + times
+        all_types = self.__types.tolist() + types
+        all_notes = self.__notes + notes
+        all_row_ids = self.__row_ids.tolist() + list(row_ids)
+
+        # Both parts are runs of the sort, rows already in the model stay in front of new rows of the same time
+        order = sorted(range(len(all_times)), key=all_times.__getitem__)
+
+        self.__times = array("q", [all_times[i] for i in order])
+        self.__types = array("q", [all_types[i] for i in order])
+        self.__notes = [all_notes[i] for i in order]
+        self.__row_ids = array("q", [all_row_ids[i] for i in order])
+
+    def remove(self, iterator: Gtk.TreeIter) -> None:
+        """
+        Removes the row of the iter.
+        """
+
+        index = self.__get_index(iterator)
+
+        del self.__times[index]
+        del self.__types[index]
+        del self.__notes[index]
+        del self.__row_ids[index]
+
+        self.__revision += 1
+        self.row_deleted(Gtk.TreePath.new_from_indices([index]))
+
+    def clear(self) -> None:
+        """
+        Removes all rows at once.
+
+        Rows are not signaled one by one, so the model must be detached from all views while clearing. Iters and row
+        references created before are invalid afterwards.
+        """
+
+        self.__revision += len(self)
+
+        self.__times = array("q")
+        self.__types = array("q")
+        self.__notes = []
+        self.__row_ids = array("q")
+
+    def set_value(self, iterator: Gtk.TreeIter, column: int, value) -> None:
+        """
+        Sets the time, type or note of the row of the iter. Changing the time moves the row to keep the order.
+        """
+
+        index = self.__get_index(iterator)
+        self.__revision += 1
+
+        if column == COLUMN_TIME:
+            self.__set_time(index, to_milliseconds(value))
+        elif column == COLUMN_TYPE:
+            self.__types[index] = self.__get_type_id(value)
+            self.__emit_row_changed(index)
+        elif column == COLUMN_NOTE:
+            self.__notes[index] = value
+            self.__emit_row_changed(index)
+        else:
+            raise ValueError("Column not editable", column)
+
+    def get_all_comments(self) -> Tuple[Comment]:
+        """
+        Returns all comments sorted by time.
+        """
+
+        names = self.__type_names
+        return tuple(Comment(_to_time_string(time), names[type_id], note)
+                     for time, type_id, note in zip(self.__times, self.__types, self.__notes))
+
+    def get_row(self, index: int) -> Tuple[int, str, str, str]:
+        """
+        Returns row id, time, type and note of the row at the index.
+        """
+
+        return (self.__row_ids[index], _to_time_string(self.__times[index]),
+                self.__type_names[self.__types[index]], self.__notes[index])
+
+    def get_rows(self) -> Iterator[Tuple[int, str, str, str]]:
+        """
+        Returns row id, time, type and note of all rows. The rows are read from copies of all columns,
+        so they can still be consumed after the model changed, e.g. by another thread.
+        """
+
+        return zip(self.__row_ids.tolist(), map(_to_time_string, self.__times.tolist()),
+                   map(list(self.__type_names).__getitem__, self.__types.tolist()), list(self.__notes))
+
+    def get_comment(self, index: int) -> Tuple[int, Comment]:
+        """
+        Returns row id and comment of the row at the index.
+        """
+
+        return self.__row_ids[index], Comment(_to_time_string(self.__times[index]),
+                                              self.__type_names[self.__types[index]], self.__notes[index])
+
+    def get_note(self, iterator: Gtk.TreeIter) -> str:
+        """
+        Returns the note of the row of the iter, the same string object as long as the note does not change.
+        """
+
+        return self.__notes[self.__get_index(iterator)]
+
+    def get_notes(self) -> List[str]:
+        """
+        Returns the notes of all rows. The list must not be modified.
+        """
+
+        return self.__notes
+
+    def get_row_ids(self) -> List[int]:
+        """
+        Returns the row ids of all rows in row order.
+        """
+
+        return self.__row_ids.tolist()
+
+    def get_indices(self, row_ids: Container[int]) -> List[int]:
+        """
+        Returns the indices of all rows with one of the row ids in row order.
+        """
+
+        return list(compress(count(), map(row_ids.__contains__, self.__row_ids)))
+
+    def get_longest_type(self) -> str:
+        """
+        Returns the longest comment type of all rows or an empty string if there are no rows.
+        """
+
+        names = self.__type_names
+        return max((names[type_id] for type_id in set(self.__types)), key=len, default="")
+
+    def __insert(self, comment: Comment) -> Gtk.TreeIter:
+        time = comment.comment_milliseconds
+        index = bisect_right(self.__times, time)
+
+        self.__times.insert(index, time)
+        self.__types.insert(index, self.__get_type_id(comment.comment_type))
+        self.__notes.insert(index, comment.comment_note)
+        self.__row_ids.insert(index, self.__next_row_id)
+        self.__next_row_id += 1
+        self.__revision += 1
+
+        iterator = self.__create_iter(index)
+        self.row_inserted(Gtk.TreePath.new_from_indices([index]), iterator)
+        return iterator
+
+    def __set_time(self, index: int, time: int) -> None:
+        all_times = self.__times
+
+        if time < all_times[index]:
+            new_index = bisect_right(all_times, time, hi=index)
+        elif time > all_times[index]:
+            # All following rows move up by one as soon as the row is taken out
+            new_index = bisect_right(all_times, time, lo=index + 1) - 1
+        else:
+            new_index = index
+
+        if new_index != index:
+            for column in (self.__times, self.__types, self.__notes, self.__row_ids):
+                column.insert(new_index, column.pop(index))
+
+            # new_order[new position] = old position
+            new_order = list(range(len(self)))
+            new_order.insert(new_index, new_order.pop(index))
+            self.rows_reordered(Gtk.TreePath(), None, new_order)
+            self.emit(signals.MPVQC_TABLE_ROW_MOVED, index, new_index)
+
+        self.__times[new_index] = time
+        self.__emit_row_changed(new_index)
+
+    def __get_type_id(self, type_name: str) -> int:
+        type_id = self.__type_ids.get(type_name)
+        if type_id is None:
+            type_id = len(self.__type_names)
+            self.__type_names.append(type_name)
+            self.__type_ids[type_name] = type_id
+        return type_id
+
+    def __emit_row_changed(self, index: int) -> None:
+        self.row_changed(Gtk.TreePath.new_from_indices([index]), self.__create_iter(index))
+
+    @staticmethod
+    def __create_iter(index: int) -> Gtk.TreeIter:
+        iterator = Gtk.TreeIter()
+        iterator.stamp = _ITER_STAMP
+        iterator.user_data = index + _ITER_OFFSET
+        return iterator
+
+    def __get_index(self, iterator: Optional[Gtk.TreeIter]) -> int:
+        if iterator is None or iterator.stamp != _ITER_STAMP or not iterator.user_data:
+            raise ValueError("Invalid iter")
+
+        index = iterator.user_data - _ITER_OFFSET
+        if index >= len(self):
+            raise ValueError("Invalid iter")
+        return index
+
+    #
+    # Gtk.TreeModel interface
+    #
+
+    def do_get_flags(self) -> Gtk.TreeModelFlags:
+        return Gtk.TreeModelFlags.LIST_ONLY
+
+    def do_get_n_columns(self) -> int:
+        return len(_COLUMN_TYPES)
+
+    def do_get_column_type(self, column: int) -> GObject.GType:
+        return _COLUMN_TYPES[column]
+
+    def do_get_iter(self, path: Gtk.TreePath):
+        indices = path.get_indices()
+        if len(indices) == 1 and 0 <= indices[0] < len(self):
+            return True, self.__create_iter(indices[0])
+        return False, None
+
+    def do_get_path(self, iterator: Gtk.TreeIter) -> Gtk.TreePath:
+        return Gtk.TreePath.new_from_indices([self.__get_index(iterator)])
+
+    def do_get_value(self, iterator: Gtk.TreeIter, column: int):
+        index = self.__get_index(iterator)
+
+        if column == COLUMN_NOTE:
+            return self.__notes[index]
+        elif column == COLUMN_TIME:
+            return _to_time_string(self.__times[index])
+        elif column == COLUMN_TYPE:
+            return self.__type_names[self.__types[index]]
+        elif column == COLUMN_ICON:
+            return PLAY_ICON
+        elif column == COLUMN_ROW_ID:
+            return self.__row_ids[index]
+        elif column == COLUMN_TIME_KEY:
+            return self.__times[index]
+        raise ValueError("Invalid column", column)
+
+    def do_iter_next(self, iterator: Gtk.TreeIter) -> bool:
+        # The iter is moved in place
+        index = self.__get_index(iterator) + 1
+        if index < len(self):
+            iterator.user_data = index + _ITER_OFFSET
+            return True
+        iterator.stamp = 0
+        return False
+
+    def do_iter_previous(self, iterator: Gtk.TreeIter) -> bool:
+        # The iter is moved in place
+        index = self.__get_index(iterator) - 1
+        if index >= 0:
+            iterator.user_data = index + _ITER_OFFSET
+            return True
+        iterator.stamp = 0
+        return False
+
+    def do_iter_children(self, parent: Optional[Gtk.TreeIter]):
+        if parent is None and len(self):
+            return True, self.__create_iter(0)
+        return False, None
+
+    def do_iter_has_child(self, _: Gtk.TreeIter) -> bool:
+        return False
+
+    def do_iter_n_children(self, iterator: Optional[Gtk.TreeIter]) -> int:
+        return len(self) if iterator is None else 0
+
+    def do_iter_nth_child(self, parent: Optional[Gtk.TreeIter], n: int):
+        if parent is None and 0 <= n < len(self):
+            return True, self.__create_iter(n)
+        return False, None
+
+    def do_iter_parent(self, _: Gtk.TreeIter):
+        return False, None
@@ -98,6 +98,8 @@ class PreferencePageExport(Gtk.ScrolledWindow):
         s.reset_import_open_video_automatically()
         s.reset_auto_save_enabled()
         s.reset_auto_save_interval()
+        s.reset_auto_save_max_age()
+        s.reset_auto_save_max_count()
 
     @template.TemplateTrans.Callback()
     def on_export_row_activated(self, __, row, *___):
@@ -118,6 +120,11 @@ class PreferencePageExport(Gtk.ScrolledWindow):
             pop.popup()
             return True
 
+    @template.TemplateTrans.Callback()
+    def on_button_browse_backups_clicked(self, _):
+        from mpvqc.ui.backupbrowser import BackupBrowser
+        BackupBrowser(transient_for=self.get_toplevel()).show_all()
+
     @template.TemplateTrans.Callback()
     def on_button_open_backup_directory_clicked(self, _):
         directory = str(get_app_paths().dir_backup)
@@ -16,13 +16,81 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+from bisect import bisect_left, bisect_right
 from gettext import gettext as _
+from itertools import compress, count
+from threading import Thread, Event
+from typing import Optional, List, Tuple, Callable
 
 from gi.repository import Gtk, Gdk, GLib
 
+import mpvqc.utils.signals as signals
 from mpvqc import template
-from mpvqc.ui.contentmaintable import get_comment_markup_mode_default, get_comment_markup_mode_search
-from mpvqc.utils import keyboard, validate_text_insertion, get_pattern
+from mpvqc.qc._searchindex import SearchIndex
+from mpvqc.ui.contentmaintable import get_comment_markup, TableChanges
+from mpvqc.utils import keyboard, validate_text_insertion, get_search_func, QueryMode
+
+# Notes missed by the search index are indexed from the main loop for at most this many seconds per iteration
+_INDEX_TIME_BUDGET = 0.01
+
+# Tables with at least this many rows are scanned in a worker thread while typing, if the index can not answer
+_BACKGROUND_SCAN_ROWS = 10000
+
+# A scan checks whether it was cancelled after each chunk of this many notes
+_SCAN_CHUNK_SIZE = 5000
+
+# A scan starts only after the query did not change for this many milliseconds, so typing does not start one per key
+_SCAN_DELAY_MS = 200
+
+
+class _Scan:
+    """
+    Searches a snapshot of all notes in a worker thread and hands the matches over to the main loop.
+    """
+
+    def __init__(self, query: str, mode: QueryMode, notes: Tuple[str, ...], revision: int,
+                 on_finished: Callable[["_Scan"], None]):
+        """
+        :param query: the text to search for
+        :param mode: how the query is matched
+        :param notes: the notes of all rows, must not change while scanning
+        :param revision: the revision of the table model the notes were taken from
+        :param on_finished: called on the main loop with the finished scan, unless the scan was cancelled
+        """
+
+        self.query = query
+        self.mode = mode
+        self.search = get_search_func(query, mode)
+        self.revision = revision
+        self.matches: List[int] = []
+
+        self.__notes = notes
+        self.__on_finished = on_finished
+        self.__cancelled = Event()
+
+        Thread(target=self.__run, name="mpvqc-search", daemon=True).start()
+
+    def cancel(self) -> None:
+        """
+        Stops the scan as soon as possible. The scan is never handed over afterwards.
+        """
+
+        self.__cancelled.set()
+
+    def __run(self) -> None:
+        notes, search, matches = self.__notes, self.search, self.matches
+
+        for start in range(0, len(notes), _SCAN_CHUNK_SIZE):
+            if self.__cancelled.is_set():
+                return
+            matches.extend(compress(count(start), map(search, notes[start:start + _SCAN_CHUNK_SIZE])))
+
+        GLib.idle_add(self.__on_idle)
+
+    def __on_idle(self) -> bool:
+        if not self.__cancelled.is_set():
+            self.__on_finished(self)
+        return False
 
 
 @template.TemplateTrans(resource_path='/data/ui/searchframe.ui')
@@ -43,11 +111,17 @@ class SearchFrame(Gtk.Frame):
         super().__init__(**kwargs)
         self.init_template()
         self.__table_widget = table_widget
-        self.__model = table_widget.get_model()
+        self.__model = table_widget.comment_model
         self.__selection_model = table_widget.get_selection()
 
         self.__table_widget.set_comment_cell_data_func(self.__comment_type_cell_data_func)
 
+        # Matches follow the rows of the model, so they stay valid while comments are edited
+        self.__model.connect("row-inserted", self.__on_row_inserted)
+        self.__model.connect("row-changed", self.__on_row_changed)
+        self.__model.connect("row-deleted", self.__on_row_deleted)
+        self.__model.connect(signals.MPVQC_TABLE_ROW_MOVED, self.__on_row_moved)
+
         self.set_property("valign", Gtk.Align.START)
         self.set_property("halign", Gtk.Align.END)
         self.revealer.set_reveal_child(False)
@@ -58,7 +132,21 @@ class SearchFrame(Gtk.Frame):
 
         self.__recent_query = ""
         self.__search_active = False
-        self.__current_matches = None
+
+        # The mode of new searches and the mode of the recent query, which can differ while scanning
+        self.__query_mode = QueryMode.TEXT
+        self.__recent_mode = QueryMode.TEXT
+
+        # The indices of all rows matching the recent query in ascending order, None if not searched yet
+        self.__current_matches: Optional[List[int]] = None
+        self.__current_search = None
+        self.__current_revision = 0
+        self.__scan: Optional[_Scan] = None
+        self.__scan_source = None
+
+        # The table is searched completely until the index caught up with it
+        self.__index = SearchIndex()
+        self.__index_source = None
 
     def do_show_all(self):
         self.revealer.hide()
@@ -81,10 +169,38 @@ class SearchFrame(Gtk.Frame):
             return True
         elif no_mod and (key == Gdk.KEY_Down or key == Gdk.KEY_Up):
             return True
+        elif alt and key == Gdk.KEY_w:
+            self.__toggle_query_mode(QueryMode.WORD)
+            return True
+        elif alt and key == Gdk.KEY_r:
+            self.__toggle_query_mode(QueryMode.REGEX)
+            return True
         return False
 
     @template.TemplateTrans.Callback()
     def on_search_changed(self, *_):
+        """
+        The search entry emits this a moment after the last keystroke only.
+        Large tables are scanned in the background once the query did not change for a moment. Until the scan
+        finished, no row is highlighted and the matches of the previous query can not be navigated.
+        """
+
+        self.__cancel_scan()
+        query = self.entry_search.get_text()
+
+        mode = self.__query_mode
+
+        if query and len(self.__model) >= _BACKGROUND_SCAN_ROWS:
+            search = get_search_func(query, mode)
+            indices = self.__find_indexed_matches(query, mode, search)
+
+            if indices is None:
+                self.__clear_matches()
+                self.__scan_source = GLib.timeout_add(_SCAN_DELAY_MS, self.__start_scan, query, mode)
+            else:
+                self.__set_matches(query, mode, search, indices, self.__model.revision)
+            return
+
         self.__table_widget.queue_draw()
         self.on_next_match(None)
 
@@ -111,13 +227,15 @@ class SearchFrame(Gtk.Frame):
     def on_focus_out_event(self, *_):
         self.__hide_search()
 
-    def clear_current_matches(self, _, has_changes):
+    def on_comments_changed(self, _, changes: TableChanges) -> None:
         """
-        Clears the current matches to force a complete research.
+        Keeps the search index up to date with the table.
         """
 
-        if has_changes:
-            self.__current_matches = None
+        self.__index.apply(changes.rows, changes.base_revision, changes.revision)
+
+        if self.__search_active:
+            self.__schedule_index_update()
 
     def toggle_search(self):
         """
@@ -134,6 +252,7 @@ class SearchFrame(Gtk.Frame):
 
     def __show_search(self):
         self.__search_active = True
+        self.__schedule_index_update()
         self.__table_widget.queue_draw()
         self.revealer.show()
         self.revealer.set_reveal_child(True)
@@ -153,26 +272,214 @@ class SearchFrame(Gtk.Frame):
             GLib.timeout_add(self.revealer.get_transition_duration(), hide_completely)
             self.__table_widget.grab_focus()
             self.__search_active = False
+            self.__cancel_scan()
             self.__table_widget.queue_draw()
 
+    def __toggle_query_mode(self, mode):
+        """
+        Switches between the given mode and plain text search and searches again.
+        """
+
+        self.__query_mode = QueryMode.TEXT if self.__query_mode == mode else mode
+
+        placeholders = {QueryMode.WORD: _("Whole words"), QueryMode.REGEX: _("Regular expression")}
+        self.entry_search.set_placeholder_text(placeholders.get(self.__query_mode, ""))
+
+        self.on_search_changed()
+
+    def __start_scan(self, query: str, mode: QueryMode) -> bool:
+        self.__scan_source = None
+        self.__scan = _Scan(query, mode, tuple(self.__model.get_notes()), self.__model.revision,
+                            self.__on_scan_finished)
+        return False
+
+    def __cancel_scan(self):
+        """
+        Cancels the scan which is about to start or running, if any.
+        """
+
+        if self.__scan_source is not None:
+            GLib.source_remove(self.__scan_source)
+            self.__scan_source = None
+
+        if self.__scan is not None:
+            self.__scan.cancel()
+            self.__scan = None
+
+    def __clear_matches(self):
+        """
+        Drops the matches of the recent query while the matches of a new one are searched.
+        """
+
+        self.__recent_query = ""
+        self.__current_matches = None
+        self.__current_search = None
+
+        self.__table_widget.queue_draw()
+        self.__update_search_results_label(None, None)
+
+    def __on_scan_finished(self, scan: _Scan):
+        self.__scan = None
+
+        if scan.revision != self.__model.revision:
+            # Matches of rows which changed meanwhile might be missing
+            self.on_search_changed()
+            return
+
+        self.__set_matches(scan.query, scan.mode, scan.search, scan.matches, scan.revision)
+
+    def __set_matches(self, query, mode, search, indices, revision):
+        """
+        Shows the matches of a new query and highlights the first one.
+        """
+
+        self.__recent_query = query
+        self.__recent_mode = mode
+        self.__current_matches = indices
+        self.__current_search = search
+        self.__current_revision = revision
+
+        self.__table_widget.queue_draw()
+        self.__highlight_match(top_to_bottom=True, continue_previous_search=False)
+
     def __update_all_matches(self, is_new_query):
         """
-        Iterates over the model and adds all matches of the latest query.
+        Searches the notes of the model and adds all matches of the latest query.
         """
 
-        if not self.__current_matches or is_new_query:
+        # Rows added without being signaled one by one, e.g. by an import, are not part of the matches
+        if self.__current_matches is None or is_new_query or self.__current_revision != self.__model.revision:
+
+            self.__cancel_scan()
+
+            query, mode = self.__recent_query, self.__recent_mode
+            search = get_search_func(query, mode)
+
+            indices = self.__find_indexed_matches(query, mode, search)
+            if indices is None:
+                indices = [index for index, note in enumerate(self.__model.get_notes()) if search(note)]
+
+            self.__current_matches = indices
+            self.__current_search = search
+            self.__current_revision = self.__model.revision
+
+    def __find_indexed_matches(self, query, mode, search) -> Optional[List[int]]:
+        """
+        :return: the indices of all matching rows or None if the search index can not answer the query
+        """
+
+        # Matches of regular expressions do not need to contain the query itself
+        if mode == QueryMode.REGEX or self.__index.revision != self.__model.revision:
+            return None
+
+        row_ids = self.__index.find(query, search)
+        if row_ids is None:
+            return None
+        return self.__model.get_indices(row_ids) if row_ids else []
+
+    def __on_row_inserted(self, _, path: Gtk.TreePath, __) -> None:
+        if self.__follows_model():
+            index = path.get_indices()[0]
+            self.__shift_matches(index, len(self.__model), 1)
+            self.__update_match(index)
+
+    def __on_row_changed(self, _, path: Gtk.TreePath, __) -> None:
+        if self.__follows_model():
+            self.__update_match(path.get_indices()[0])
+
+    def __on_row_deleted(self, _, path: Gtk.TreePath) -> None:
+        if self.__follows_model():
+            index = path.get_indices()[0]
+            self.__remove_match(index)
+            self.__shift_matches(index + 1, len(self.__model) + 1, -1)
+            self.__current_revision = self.__model.revision
+
+    def __on_row_moved(self, _, index: int, new_index: int) -> None:
+        # The row is signaled as changed afterwards, which completes the change
+        if self.__follows_model():
+            matched = self.__remove_match(index)
+
+            # All rows between both indices moved by one towards the previous index of the row
+            if index < new_index:
+                self.__shift_matches(index + 1, new_index + 1, -1)
+            else:
+                self.__shift_matches(new_index, index, 1)
+
+            if matched:
+                self.__add_match(new_index)
+
+    def __follows_model(self) -> bool:
+        """
+        Tells whether the matches can follow the change the model signals right now.
+        Matches which missed changes, e.g. rows loaded without being signaled one by one, are dropped.
+
+        :return: True if the matches differ from the model by the signaled change only, False else
+        """
+
+        if self.__current_matches is None:
+            return False
+
+        if self.__current_revision != self.__model.revision - 1:
+            self.__current_matches = None
+            return False
+        return True
+
+    def __update_match(self, index: int) -> None:
+        """
+        Adds or removes the row at the index depending on whether its note matches the recent query.
+        """
+
+        if self.__current_search(self.__model.get_notes()[index]):
+            self.__add_match(index)
+        else:
+            self.__remove_match(index)
 
-            pattern = get_pattern(self.__recent_query)
+        self.__current_revision = self.__model.revision
 
-            matches = []
-            iterator = self.__model.get_iter_first()
-            while iterator:
-                comment = self.__model.get_value(iterator, 3)
-                if pattern.search(comment):
-                    matches.append(self.__model.get_path(iterator))
-                iterator = self.__model.iter_next(iterator)
+    def __add_match(self, index: int) -> None:
+        matches = self.__current_matches
+        position = bisect_left(matches, index)
 
-            self.__current_matches = matches
+        if position == len(matches) or matches[position] != index:
+            matches.insert(position, index)
+
+    def __remove_match(self, index: int) -> bool:
+        """
+        :return: True if the row at the index was a match, False else
+        """
+
+        matches = self.__current_matches
+        position = bisect_left(matches, index)
+
+        if position < len(matches) and matches[position] == index:
+            del matches[position]
+            return True
+        return False
+
+    def __shift_matches(self, start: int, end: int, offset: int) -> None:
+        """
+        Moves all matches from start (inclusive) to end (exclusive) by the offset.
+        """
+
+        matches = self.__current_matches
+        low, high = bisect_left(matches, start), bisect_left(matches, end)
+
+        if low < high:
+            matches[low:high] = [index + offset for index in matches[low:high]]
+
+    def __schedule_index_update(self):
+        """
+        Indexes all notes the search index missed, a time budgeted chunk per main loop iteration.
+        """
+
+        if self.__index_source is None and self.__index.revision != self.__model.revision:
+            self.__index_source = GLib.idle_add(self.__on_index_update)
+
+    def __on_index_update(self) -> bool:
+        if self.__index.update(self.__model, _INDEX_TIME_BUDGET):
+            self.__index_source = None
+            return False
+        return True
 
     def __highlight_next(self, top_to_bottom):
         """
@@ -182,40 +489,43 @@ class SearchFrame(Gtk.Frame):
         """
 
         new_query = self.entry_search.get_text()
-        continue_previous_search = self.__recent_query == new_query
+        continue_previous_search = self.__recent_query == new_query and self.__recent_mode == self.__query_mode
         self.__recent_query = new_query
+        self.__recent_mode = self.__query_mode
 
         if self.__recent_query:
             self.__update_all_matches(is_new_query=not continue_previous_search)
 
+        self.__highlight_match(top_to_bottom, continue_previous_search)
+
+    def __highlight_match(self, top_to_bottom, continue_previous_search):
+        """
+        Highlights the next match of the recent query.
+
+        :param top_to_bottom: True if should go down, False else.
+        :param continue_previous_search: True to start at the selected row, False to start at the first match.
+        """
+
+        if self.__recent_query:
             matches = self.__current_matches
             if matches:
-                matches_size = len(matches)
-                if continue_previous_search:
-                    selected_iter = self.__selection_model.get_selected()[1]
-                    selected_row = self.__model.get_path(selected_iter)
+                # when query is new or search started again from top
+                position = 0
 
-                    if top_to_bottom:
-                        for idx, match in enumerate(matches):
-                            if match > selected_row:
-                                self.__table_widget.highlight_row(match)
-                                self.__update_search_results_label(idx + 1, matches_size)
-                                return
-                    else:  # bottom -> top
-                        for idx, match in enumerate(reversed(matches)):
-                            if match < selected_row:
-                                self.__table_widget.highlight_row(match)
-                                self.__update_search_results_label(matches_size - idx, matches_size)
-                                return
-
-                        # when search started again from bottom
-                        self.__table_widget.highlight_row(matches[-1])
-                        self.__update_search_results_label(matches_size, matches_size)
-                        return
+                selected_iter = self.__selection_model.get_selected()[1]
+                if continue_previous_search and selected_iter is not None:
+                    selected_row = self.__model.get_path(selected_iter).get_indices()[0]
 
-                # when query is new or search started again from top
-                self.__table_widget.highlight_row(matches[0])
-                self.__update_search_results_label(1, matches_size)
+                    if top_to_bottom:
+                        position = bisect_right(matches, selected_row)
+                        if position == len(matches):
+                            position = 0
+                    else:  # bottom -> top, when search started again from bottom the last match
+                        position = bisect_left(matches, selected_row) - 1
+
+                position %= len(matches)
+                self.__table_widget.highlight_row(Gtk.TreePath.new_from_indices([matches[position]]))
+                self.__update_search_results_label(position + 1, len(matches))
                 return
 
         self.__update_search_results_label(None, None)
@@ -241,10 +551,6 @@ class SearchFrame(Gtk.Frame):
         Specify how text in the tree view is highlighted.
         """
 
-        text = tree_model.get_value(tree_iter, 3)
-        query = self.__recent_query
-
-        if self.__search_active and query:
-            cell.set_property("markup", get_comment_markup_mode_search(text, query))
-        else:
-            cell.set_property("markup", get_comment_markup_mode_default(text))
\ No newline at end of file
+        query = self.__recent_query if self.__search_active else None
+        cell.set_property("markup",
+                          get_comment_markup(tree_model.get_note(tree_iter), query or None, self.__recent_mode))
\ No newline at end of file
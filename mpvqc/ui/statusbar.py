@@ -16,6 +16,8 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+from gettext import gettext as _
+
 from gi.repository import Gtk, GLib
 
 import mpvqc.utils.signals as signals
@@ -133,23 +135,34 @@ class StatusBar(Gtk.Box):
             self.__comment_selected = str(int(rows[0].to_string()) + 1)
             self.__on_line_label_update()
 
-    def on_comments_row_changed(self, model, idx, *_):
+    def on_comments_changed(self, widget, changes):
         """
-        Called whenever a row of the table widget has changed.
+        Called whenever rows of the table widget have changed.
 
-        :param model: passed in from event
-        :param idx: passed in from event
+        :param widget: passed in from event
+        :param changes: passed in from event
         """
 
-        model_length = len(model)
+        model_length = len(widget.comment_model)
         self.__comment_count = str(model_length)
 
         # If a row changes it must have been selected.
         # It is needed here, because after a time change the selection event is not fired.
-        self.__comment_selected = str(min(int(idx.to_string()) + 1, model_length))
+        self.__comment_selected = str(min(changes.last_index + 1, model_length))
 
         self.__on_line_label_update()
 
+    def on_comments_load_progress(self, __, added: int, total: int):
+        """
+        Called while the table widget adds comments in the background.
+
+        :param added: the amount of comments added so far
+        :param total: the amount of comments to add
+        """
+
+        message = _("Loading comments: {}%").format(added * 100 // total)
+        self.message_stack.display_message(message, StatusbarMessageDuration.LONG)
+
     def update_statusbar_message(self, _, message: str, sb_message_duration=StatusbarMessageDuration.SHORT):
         """
         Updates the current statusbar message.
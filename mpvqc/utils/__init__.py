@@ -18,13 +18,19 @@
 
 import re
 from enum import Enum
+from functools import lru_cache, partial
 
 from gi.repository import Gtk, GLib
 
+from mpvqc.qc import replace_special_characters
+
 formatted_string_pattern = re.compile(r"\d{2}:\d{2}:\d{2}")
 
-# A dictionary of "query" -> pattern
-_CACHED_PATTERNS = {}
+# Patterns of the recent queries, every prefix of a typed query is looked up once
+_PATTERN_CACHE_SIZE = 128
+
+# Used for regular expressions which can not be compiled
+_PATTERN_NO_MATCH = re.compile(r"(?!)")
 
 
 def seconds_float_to_formatted_string_hours(seconds: float, short=True) -> str:
@@ -44,7 +50,7 @@ def seconds_float_to_formatted_string_hours(seconds: float, short=True) -> str:
 
 
 def formatted_string_to_int(formatted_string):
-    """
+    r"""
     Converts a valid formatted time string into the amount of seconds.
 
     :param formatted_string: A string matching pattern "\d{2}:\d{2}:\d{2}"
@@ -57,23 +63,6 @@ def formatted_string_to_int(formatted_string):
     return int(split[0]) * 60 * 60 + int(split[1]) * 60 + int(split[2])
 
 
-def get_longest_string_from(model, column=0):
-    """
-    Returns the longest string (string with the most characters) of the given model.
-
-    :param model: a model to extract the longest string
-    :param column: the column to look into (as int type)
-    :return: the longest string from the given model
-    """
-
-    items = []
-    iterator = model.get_iter_first()
-    while iterator:
-        items.append(model.get_value(iterator, column))
-        iterator = model.iter_next(iterator)
-    return max(items, key=len)
-
-
 def list_header_func(row, before, user_data):
     """
     Used to draw separators in a list widget by setting the function listbox.set_header_func(list_header_func, None)
@@ -109,16 +98,14 @@ class StatusbarMessageDuration(Enum):
     LONG = 5000
 
 
-def replace_special_characters(string_to_replace):
+class QueryMode(Enum):
     """
-    Removes forbidden characters in a string.
-
-    :param string_to_replace: the original string
-    :return: the modified string
+    How a search query is matched, always case insensitive.
     """
 
-    return string_to_replace \
-        .replace(u'\xad', '')  # https://www.charbase.com/00ad-unicode-soft-hyphen
+    TEXT = 0
+    WORD = 1
+    REGEX = 2
 
 
 def validate_text_insertion(editable, new_inserted_text, *data):
@@ -143,19 +130,55 @@ def validate_text_insertion(editable, new_inserted_text, *data):
     return new_pos
 
 
-def get_pattern(query):
+@lru_cache(maxsize=_PATTERN_CACHE_SIZE)
+def get_pattern(query, mode=QueryMode.TEXT):
+    """
+    Returns a case insensitive pattern of query. Regular expressions may match empty strings, see has_match.
+    The patterns of the recent queries are cached, get_pattern.cache_info() tells hits and misses.
+
+    :param query: the text to search for, a regular expression in regex mode
+    :param mode: whether query matches anywhere, whole words only or as regular expression
+    :return: the pattern, one matching nothing if the regular expression is invalid
+    """
+
+    if mode == QueryMode.REGEX:
+        try:
+            return re.compile(query, re.IGNORECASE)
+        except re.error:
+            return _PATTERN_NO_MATCH
+
+    if mode == QueryMode.WORD:
+        return re.compile(r"(?<!\w){}(?!\w)".format(re.escape(query)), re.IGNORECASE)
+
+    return re.compile(re.escape(query), re.IGNORECASE)
+
+
+def has_match(pattern, text) -> bool:
+    """
+    Returns True if the pattern matches at least one non-empty part of text, False else.
+    """
+
+    return any(match.end() > match.start() for match in pattern.finditer(text))
+
+
+def get_search_func(query, mode=QueryMode.TEXT):
     """
-    Returns a case insensitive pattern of query.
+    Returns a function telling whether a text matches the query, ignoring empty matches of regular expressions.
+
+    :param query: the text to search for, a regular expression in regex mode
+    :param mode: whether query matches anywhere, whole words only or as regular expression
     """
 
-    pattern_q = _CACHED_PATTERNS.get(query, None)
-    if pattern_q is None:
-        pattern_q = re.compile(r"({})".format(re.escape(query)), re.IGNORECASE)
-        _CACHED_PATTERNS.update({query: pattern_q})
-    return pattern_q
+    pattern = get_pattern(query, mode)
+
+    if mode == QueryMode.REGEX:
+        return partial(has_match, pattern)
 
+    # Escaped queries never match empty strings
+    return pattern.search
 
-def get_markup(current_text, query, highlight_prefix, highlight_suffix):
+
+def get_markup(current_text, query, highlight_prefix, highlight_suffix, mode=QueryMode.TEXT):
     """
     Returns the current text as markup highlighting all query occurrences case insensitive.
     Highlighting must be set by highlight_prefix and highlight_suffix.
@@ -166,7 +189,20 @@ def get_markup(current_text, query, highlight_prefix, highlight_suffix):
     :param current_text: the current text
     :param highlight_prefix: specify what to insert before query
     :param highlight_suffix: specify what to insert after query
-    :return: markup with all query occurrences highlighted specified by highlight_prefix and highlight_suffix
+    :param mode: whether query matches anywhere, whole words only or as regular expression
+    :return: markup with all query occurrences highlighted specified by highlight_prefix and highlight_suffix and
+             the number of highlighted occurrences
     """
 
-    return get_pattern(query=query).subn(r"{}\1{}".format(highlight_prefix, highlight_suffix), current_text)
+    highlighted = []
+
+    def highlight(match):
+        # The text of the note stays as it is, empty matches of regular expressions are not highlighted
+        text = match.group(0)
+        if not text:
+            return text
+        highlighted.append(text)
+        return highlight_prefix + text + highlight_suffix
+
+    markup = get_pattern(query, mode).sub(highlight, current_text)
+    return markup, len(highlighted)
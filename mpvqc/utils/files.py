@@ -30,6 +30,7 @@ class FilePaths:
 
         documents = Path(GLib.get_user_special_dir(GLib.USER_DIRECTORY_DOCUMENTS))
         pictures = Path(GLib.get_user_special_dir(GLib.USER_DIRECTORY_PICTURES))
+        cache = Path(GLib.get_user_cache_dir())
 
         config = environ.get('APPDATA') or environ.get('XDG_CONFIG_HOME')
         config = Path(config) if config else Path.home() / ".config"
@@ -37,6 +38,9 @@ class FilePaths:
         self.__dir_backup = documents / app_name / "backup"
         self.__dir_backup.mkdir(exist_ok=True, parents=True)
 
+        self.__dir_cache = cache / app_name / "documents"
+        self.__dir_cache.mkdir(exist_ok=True, parents=True)
+
         self.__dir_config = config / app_name
         self.__dir_config.mkdir(exist_ok=True, parents=True)
 
@@ -47,6 +51,10 @@ class FilePaths:
     def dir_backup(self) -> Path:
         return self.__dir_backup
 
+    @property
+    def dir_cache(self) -> Path:
+        return self.__dir_cache
+
     @property
     def dir_config(self) -> Path:
         return self.__dir_config
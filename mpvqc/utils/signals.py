@@ -43,5 +43,11 @@ MPVQC_STATUSBAR_UPDATE \
     = "mpvqc-statusbar-update"
 MPVQC_TABLE_CONTENT_CHANGED \
     = "mpvqc-table-content-changed"
+MPVQC_TABLE_LOAD_FINISHED \
+    = "mpvqc-table-load-finished"
+MPVQC_TABLE_LOAD_PROGRESS \
+    = "mpvqc-table-load-progress"
+MPVQC_TABLE_ROW_MOVED \
+    = "mpvqc-table-row-moved"
 MPVQC_USER_RESIZE_VIDEO \
     = "mpvqc-user-resize-video"
@@ -22,9 +22,9 @@ from gettext import gettext as _
 
 from mpvqc import get_settings
 
-_REGEX_EMPTY = re.compile("\S+")
-_REGEX_NICK = re.compile("^([a-zA-Z0-9-öäüÖÄÜ]|\s)*$")
-_REGEX_COMMENT_TYPE = re.compile("^([a-zA-Z-öäüÖÄÜ]|\s)*$")
+_REGEX_EMPTY = re.compile(r"\S+")
+_REGEX_NICK = re.compile(r"^([a-zA-Z0-9-öäüÖÄÜ]|\s)*$")
+_REGEX_COMMENT_TYPE = re.compile(r"^([a-zA-Z-öäüÖÄÜ]|\s)*$")
 
 
 class Validator: